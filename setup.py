@@ -13,6 +13,9 @@ setup(name="tap-xero",
           "requests==2.32.4",
       ],
       extras_require={
+          'fast_json': [
+              'orjson'
+          ],
           'dev': [
               'ipdb',
               'pylint',
@@ -25,7 +28,8 @@ setup(name="tap-xero",
       """,
       packages=["tap_xero"],
       package_data = {
-          "schemas": ["tap_xero/schemas/*.json"]
+          "schemas": ["tap_xero/schemas/*.json"],
+          "tap_xero": ["schema_bundle.json"]
       },
       include_package_data=True,
 )
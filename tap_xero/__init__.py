@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
+# Taken before any other import, so that the startup timing reported with
+# TAP_XERO_DEBUG_TIMING covers the imports below.
+import time
+IMPORT_STARTED = time.perf_counter()
+# pylint: disable=wrong-import-position
 import os
 import json
+import functools
+from concurrent import futures
 import singer
 from singer import metadata, metrics, utils
 from singer.catalog import Catalog, CatalogEntry, Schema
 from . import streams as streams_
-from .client import XeroClient
+from .client import XeroClient, get_config_int, get_tenant_ids
 from .context import Context
+# pylint: enable=wrong-import-position
 
 REQUIRED_CONFIG_KEYS = [
     "start_date",
@@ -19,6 +27,12 @@ REQUIRED_CONFIG_KEYS = [
 
 LOGGER = singer.get_logger()
 
+DEFAULT_TENANT_WORKERS = 4
+
+# Every stream's schema with its dependencies already resolved, generated
+# by `python -m tap_xero.build_schema_bundle`
+SCHEMA_BUNDLE_PATH = "schema_bundle.json"
+
 BAD_CREDS_MESSAGE = (
     "Failed to refresh OAuth token using the credentials from both the config and S3. "
     "The token might need to be reauthorized from the integration's properties "
@@ -31,21 +45,68 @@ class BadCredsException(Exception):
     pass
 
 
+class StartupTimer():
+    """Measures the phases of startup and logs them when the
+    TAP_XERO_DEBUG_TIMING environment variable is set. For a breakdown of
+    the imports themselves, run the tap with `python -X importtime`."""
+    def __init__(self, started):
+        self.enabled = os.environ.get("TAP_XERO_DEBUG_TIMING") in ("1", "true")
+        self.last = started
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def log(self):
+        if self.enabled:
+            LOGGER.info("Startup timing: %s, total=%.1fms",
+                        ", ".join("{}={:.1f}ms".format(phase, seconds * 1000)
+                                  for phase, seconds in self.phases),
+                        sum(seconds for _, seconds in self.phases) * 1000)
+
+
 def get_abs_path(path):
     return os.path.join(os.path.dirname(os.path.realpath(__file__)), path)
 
 
-def load_schema(tap_stream_id):
+def read_schema_file(tap_stream_id):
+    """Reads a schema and its dependencies from their files, bypassing the
+    bundle."""
     path = "schemas/{}.json".format(tap_stream_id)
     schema = utils.load_json(get_abs_path(path))
     dependencies = schema.pop("tap_schema_dependencies", [])
     refs = {}
     for sub_stream_id in dependencies:
-        refs[sub_stream_id] = load_schema(sub_stream_id)
+        refs[sub_stream_id] = read_schema_file(sub_stream_id)
     if refs:
         singer.resolve_schema_references(schema, refs)
     return schema
 
+
+@functools.lru_cache(maxsize=None)
+def _load_schema_bundle():
+    path = get_abs_path(SCHEMA_BUNDLE_PATH)
+    if not os.path.exists(path):
+        return {}
+    return utils.load_json(path)
+
+
+@functools.lru_cache(maxsize=None)
+def _schema_json(tap_stream_id):
+    bundle = _load_schema_bundle()
+    if tap_stream_id in bundle:
+        return json.dumps(bundle[tap_stream_id])
+    return json.dumps(read_schema_file(tap_stream_id))
+
+
+def load_schema(tap_stream_id):
+    """Returns the resolved schema of a stream. Each schema is read and
+    resolved once per process, from the bundle when it has it, and every
+    call gets its own copy which it is free to modify."""
+    return json.loads(_schema_json(tap_stream_id))
+
 def load_metadata(stream, schema):
     mdata = metadata.new()
 
@@ -85,38 +146,139 @@ def discover(ctx):
     return catalog
 
 
-def load_and_write_schema(stream):
-    singer.write_schema(
+def load_and_write_schema(ctx, stream):
+    schema = load_schema(stream.tap_stream_id)
+    key_properties = stream.pk_fields
+    schema["properties"].update(stream.extra_properties(ctx))
+    if ctx.tenant_id:
+        # Records of every tenant share a stream, so the tenant becomes
+        # part of the key.
+        schema["properties"][streams_.TENANT_ID_KEY] = {"type": ["string"]}
+        key_properties = [streams_.TENANT_ID_KEY] + key_properties
+    ctx.writer.write_schema(
         stream.tap_stream_id,
-        load_schema(stream.tap_stream_id),
-        stream.pk_fields,
+        schema,
+        key_properties,
     )
 
 
-def sync(ctx):
-    ctx.refresh_credentials()
+def sync_stream(ctx, stream):
+    LOGGER.info("Syncing stream: %s", stream.tap_stream_id)
+    catalog_entry = ctx.catalog.get_stream(stream.tap_stream_id)
+    ctx.client.configure_stream(stream.tap_stream_id, catalog_entry.schema.to_dict(),
+                                catalog_entry.metadata)
+    with ctx.profile_stream(stream.tap_stream_id):
+        stream.sync(ctx)
+    ctx.get_record_transformer(stream.tap_stream_id, stream.pruner).log_warning()
+
+
+def sync_concurrently(ctx, streams, max_workers):
+    """Syncs the streams on a bounded pool of worker threads. All workers
+    share the context, and so one client and one rate limit budget."""
+    # Write every schema up front so that interleaved records from
+    # different streams are always preceded by their SCHEMA message.
+    for stream in streams:
+        load_and_write_schema(ctx, stream)
+
+    def _sync(stream):
+        ctx.mark_syncing(stream.tap_stream_id)
+        ctx.write_state()
+        sync_stream(ctx, stream)
+        ctx.mark_synced(stream.tap_stream_id)
+        ctx.write_state()
+
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        wait_for_all([executor.submit(_sync, stream) for stream in streams], ctx.stopped)
+
+
+def wait_for_all(pending, stopped):
+    """Waits for the futures and re-raises the first failure. On a failure,
+    whatever has not started yet is cancelled and `stopped` is set, so that
+    the running syncs stop at their next request."""
+    done, not_done = futures.wait(pending, return_when=futures.FIRST_EXCEPTION)
+    if not_done:
+        stopped.set()
+    for future in not_done:
+        future.cancel()
+    for future in done:
+        future.result()
+
+
+def sync_serially(ctx, stream_ids_to_sync):
     currently_syncing = ctx.state.get("currently_syncing")
     start_idx = streams_.all_stream_ids.index(currently_syncing) \
         if currently_syncing else 0
-    stream_ids_to_sync = [cs.tap_stream_id for cs in ctx.catalog.streams
-                          if cs.is_selected()]
     streams = [s for s in streams_.all_streams[start_idx:]
                if s.tap_stream_id in stream_ids_to_sync]
     for stream in streams:
         ctx.state["currently_syncing"] = stream.tap_stream_id
         ctx.write_state()
-        load_and_write_schema(stream)
-        LOGGER.info("Syncing stream: %s", stream.tap_stream_id)
-        stream.sync(ctx)
+        load_and_write_schema(ctx, stream)
+        sync_stream(ctx, stream)
     ctx.state["currently_syncing"] = None
     ctx.write_state()
 
 
+def sync_tenant(ctx, stream_ids_to_sync):
+    max_workers = get_config_int(ctx.config, "max_stream_workers", 1)
+    if max_workers > 1:
+        # Streams that were interrupted on the previous run are resumed
+        # first, the rest follow in their usual order.
+        syncing = ctx.get_syncing_streams()
+        streams = sorted(
+            (s for s in streams_.all_streams if s.tap_stream_id in stream_ids_to_sync),
+            key=lambda s: s.tap_stream_id not in syncing)
+        ctx.state["currently_syncing"] = None
+        sync_concurrently(ctx, streams, max_workers)
+        ctx.state.pop("syncing_streams", None)
+        ctx.write_state()
+    else:
+        sync_serially(ctx, stream_ids_to_sync)
+
+
+def sync_tenants(ctx, tenant_ids, stream_ids_to_sync):
+    """Syncs several tenants concurrently from one process. The tenants
+    share the access token, the connection pool, the app minute limit and
+    stdout, while each has its own bookmarks and per tenant limits."""
+    max_workers = get_config_int(ctx.config, "max_tenant_workers", DEFAULT_TENANT_WORKERS)
+
+    def _sync(tenant_id):
+        LOGGER.info("Syncing tenant: %s", tenant_id)
+        sync_tenant(ctx.for_tenant(tenant_id), stream_ids_to_sync)
+
+    with futures.ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        wait_for_all([executor.submit(_sync, tenant_id) for tenant_id in tenant_ids], ctx.stopped)
+
+
+def sync(ctx):
+    ctx.refresh_credentials()
+    stream_ids_to_sync = [cs.tap_stream_id for cs in ctx.catalog.streams
+                          if cs.is_selected()]
+    tenant_ids = get_tenant_ids(ctx.config)
+
+    try:
+        if len(tenant_ids) > 1:
+            sync_tenants(ctx, tenant_ids, stream_ids_to_sync)
+        else:
+            sync_tenant(ctx, stream_ids_to_sync)
+    finally:
+        # Whatever was buffered is still valid output: the pending STATE
+        # only ever covers records that are written before it.
+        ctx.writer.flush()
+        ctx.client.log_pool_metrics()
+
+
 
 def main_impl():
+    timer = StartupTimer(IMPORT_STARTED)
+    timer.mark("imports")
     args = utils.parse_args(REQUIRED_CONFIG_KEYS)
+    timer.mark("parse_args")
     if args.discover:
-        discover(Context(args.config, {}, {}, args.config_path)).dump()
+        catalog = discover(Context(args.config, {}, {}, args.config_path))
+        timer.mark("discover")
+        timer.log()
+        catalog.dump()
         print()
     else:
         if args.catalog:
@@ -124,8 +286,12 @@ def main_impl():
         else:
             LOGGER.info("Running sync without provided Catalog. Discovering.")
             catalog = discover(Context(args.config, {}, {}, args.config_path))
+            timer.mark("discover")
 
-        sync(Context(args.config, args.state, catalog, args.config_path))
+        ctx = Context(args.config, args.state, catalog, args.config_path)
+        timer.mark("context")
+        timer.log()
+        sync(ctx)
 
 def main():
     try:
@@ -0,0 +1,24 @@
+"""Regenerates the bundle of resolved stream schemas which `load_schema`
+reads instead of the individual schema files. Run it after changing any
+schema:
+
+    python -m tap_xero.build_schema_bundle
+"""
+import json
+from . import SCHEMA_BUNDLE_PATH, get_abs_path, read_schema_file
+from . import streams as streams_
+
+
+def build_bundle():
+    return {stream.tap_stream_id: read_schema_file(stream.tap_stream_id)
+            for stream in streams_.all_streams}
+
+
+def main():
+    bundle = build_bundle()
+    with open(get_abs_path(SCHEMA_BUNDLE_PATH), "w") as bundle_file:
+        json.dump(bundle, bundle_file, sort_keys=True, separators=(",", ":"))
+
+
+if __name__ == "__main__":
+    main()
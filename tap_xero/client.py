@@ -1,21 +1,56 @@
 from base64 import b64encode
+import copy
 import re
 import json
+import codecs
 import decimal
+import functools
 import sys
 import math
+import threading
+import time as time_
+from collections import deque
 from os.path import join
 from datetime import datetime, date, time, timedelta
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from singer.utils import strftime, strptime_to_utc
 import six
 import pytz
 import backoff
 import singer
+from singer import metadata, metrics
+from .compiled_transform import get_dropped_fields
+from .json_codec import build_codec
+from .profiling import NULL_PROFILER
+from .token_cache import build_token_cache
 
 LOGGER = singer.get_logger()
 
 BASE_URL = "https://api.xero.com/api.xro/2.0"
+TOKEN_URL = "https://identity.xero.com/connect/token"
+
+# https://developer.xero.com/documentation/guides/oauth2/limits/
+MINUTE_LIMIT = 60
+DAY_LIMIT = 5000
+APP_MINUTE_LIMIT = 10000
+CONCURRENT_LIMIT = 5
+
+# Seconds to wait for a connection, and then for each read from the socket
+CONNECT_TIMEOUT = 30
+DEFAULT_REQUEST_TIMEOUT = 300
+# Retries of GETs on connection errors, such as a reset of a pooled
+# connection which the server had already closed
+DEFAULT_CONNECTION_RETRIES = 3
+
+STREAM_CHUNK_SIZE = 64 * 1024
+# Negotiated explicitly rather than relying on whatever the installed
+# urllib3 happens to advertise.
+ACCEPT_ENCODING = "gzip, deflate"
+WHITESPACE = re.compile(r'\s*')
+# The characters which may follow a complete value inside an object or array
+VALUE_DELIMITERS = frozenset(",:]} \t\n\r")
 
 
 class XeroError(Exception):
@@ -105,17 +140,32 @@ ERROR_CODE_EXCEPTION_MAPPING = {
 }
 
 
+# Xero datetimes can be .NET JSON date strings which look like
+# "/Date(1419937200000+0000)/"
+# https://developer.xero.com/documentation/api/requests-and-responses
+DOTNET_DATE_PATTERN = re.compile(r'Date\((\-?\d+)([-+])?(\d+)?\)')
+ISO8601_PATTERN = re.compile(r'((\d{4})-([0-2]\d)-0?([0-3]\d)T([0-5]\d):([0-5]\d):([0-6]\d))')
+ISO8601_MIN_LENGTH = len("2020-01-01T00:00:00")
+
+# Schedule.EndDate on repeating invoices is a Xero date that the schema
+# exposes as a plain string, so it is always converted.
+UNDECLARED_DATE_KEYS = frozenset(["EndDate"])
+
+
+def _may_be_date(value):
+    # Cheaply rejects the names, IDs and descriptions which make up most of
+    # the strings in a response before either pattern is tried.
+    return "Date(" in value or (len(value) >= ISO8601_MIN_LENGTH and "T" in value)
+
+
 def parse_date(value):
-    # Xero datetimes can be .NET JSON date strings which look like
-    # "/Date(1419937200000+0000)/"
-    # https://developer.xero.com/documentation/api/requests-and-responses
-    pattern = r'Date\((\-?\d+)([-+])?(\d+)?\)'
-    match = re.search(pattern, value)
+    if not _may_be_date(value):
+        return None
 
-    iso8601pattern = r'((\d{4})-([0-2]\d)-0?([0-3]\d)T([0-5]\d):([0-5]\d):([0-6]\d))'
+    match = DOTNET_DATE_PATTERN.search(value)
 
     if not match:
-        iso8601match = re.search(iso8601pattern, value)
+        iso8601match = ISO8601_PATTERN.search(value)
         if iso8601match:
             try:
                 return strptime_to_utc(value)
@@ -140,21 +190,181 @@ def parse_date(value):
         + timedelta(hours=offset_hours, minutes=offset_minutes)
 
 
+@functools.lru_cache(maxsize=8192)
+def _format_date(value):
+    value = parse_date(value)
+    if value:
+        # NB> Pylint disabled because, regardless of idioms, this is more explicit than isinstance.
+        if type(value) is date: # pylint: disable=unidiomatic-typecheck
+            value = datetime.combine(value, time.min)
+        value = value.replace(tzinfo=pytz.UTC)
+        return strftime(value)
+    return None
+
+
+def format_date(value):
+    """Returns the RFC3339 form of a Xero date string, or None if the value
+    is not a date. Results are cached as the same timestamps recur
+    throughout a page."""
+    if not _may_be_date(value):
+        return None
+    return _format_date(value)
+
+
 def _json_load_object_hook(_dict):
     """Hook for json.parse(...) to parse Xero date formats."""
     # This was taken from the pyxero library and modified
     # to format the dates according to RFC3339
     for key, value in _dict.items():
         if isinstance(value, six.string_types):
-            value = parse_date(value)
+            value = format_date(value)
             if value:
-                # NB> Pylint disabled because, regardless of idioms, this is more explicit than isinstance.
-                if type(value) is date: # pylint: disable=unidiomatic-typecheck
-                    value = datetime.combine(value, time.min)
-                value = value.replace(tzinfo=pytz.UTC)
-                _dict[key] = strftime(value)
+                _dict[key] = value
     return _dict
 
+
+def _convert_dates(_dict, keys):
+    for key in keys:
+        value = _dict.get(key)
+        if isinstance(value, six.string_types):
+            value = format_date(value)
+            if value:
+                _dict[key] = value
+
+
+def _convert_all_dates(value, date_keys):
+    """Converts the date keys of every object within `value`, whatever the
+    schema says about it."""
+    if isinstance(value, dict):
+        for item in value.values():
+            _convert_all_dates(item, date_keys)
+        _convert_dates(value, date_keys.intersection(value))
+    elif isinstance(value, list):
+        for item in value:
+            _convert_all_dates(item, date_keys)
+
+
+def _compile_date_walker(schema, date_keys):
+    """Returns a function which converts the dates of a decoded value in
+    place, visiting only the properties of the schema under which a date
+    key can appear, or None when none can. Values which the schema does not
+    describe property by property are walked in full."""
+    if not isinstance(schema, dict) or "anyOf" in schema or "type" not in schema \
+       or schema.get("patternProperties"):
+        return functools.partial(_convert_all_dates, date_keys=date_keys)
+    types = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+    walkers = []
+
+    if "object" in types:
+        properties = schema.get("properties")
+        if not properties:
+            return functools.partial(_convert_all_dates, date_keys=date_keys)
+        keys = tuple(key for key in properties if key in date_keys)
+        children = tuple((key, walker) for key, walker in
+                         ((key, _compile_date_walker(prop, date_keys)) for key, prop in properties.items())
+                         if walker is not None)
+        if keys or children:
+            def _walk_object(value):
+                if isinstance(value, dict):
+                    for key, walker in children:
+                        child = value.get(key)
+                        if child is not None:
+                            walker(child)
+                    _convert_dates(value, keys)
+            walkers.append(_walk_object)
+
+    if "array" in types:
+        item_walker = _compile_date_walker(schema.get("items"), date_keys)
+        if item_walker is not None:
+            def _walk_array(value):
+                if isinstance(value, list):
+                    for item in value:
+                        item_walker(item)
+            walkers.append(_walk_array)
+
+    if not walkers:
+        return None
+    if len(walkers) == 1:
+        return walkers[0]
+    def _walk_any(value):
+        for walker in walkers:
+            walker(value)
+    return _walk_any
+
+
+def make_record_decoder(schema, dropped=()):
+    """Builds the function which finishes decoding a record of a stream that
+    was parsed without an object hook. The `dropped` fields, which the
+    catalog deselects, are removed, and then the dates of the remaining
+    fields are converted. Deselected subtrees are never visited, where the
+    object hook had to convert every date in the response."""
+    date_keys = get_date_time_keys(schema)
+    properties = {key: prop for key, prop in schema.get("properties", {}).items() if key not in dropped}
+    walker = _compile_date_walker(dict(schema, properties=properties), date_keys)
+    dropped = tuple(dropped)
+
+    def _decode_record(record):
+        if isinstance(record, dict):
+            for key in dropped:
+                record.pop(key, None)
+        if walker is not None:
+            walker(record)
+        return record
+    return _decode_record
+
+
+def get_date_time_keys(schema):
+    """Collects the names of every property, at any depth, which the schema
+    declares with the date-time format."""
+    keys = set(UNDECLARED_DATE_KEYS)
+    def _walk(node):
+        if isinstance(node, dict):
+            for key, prop in node.get("properties", {}).items():
+                if isinstance(prop, dict) and prop.get("format") == "date-time":
+                    keys.add(key)
+                _walk(prop)
+            _walk(node.get("items"))
+            for sub_schema in node.get("anyOf", []):
+                _walk(sub_schema)
+    _walk(schema)
+    return frozenset(keys)
+
+def get_config_int(config, key, default):
+    """Config values may arrive as strings from the UI, so normalise
+    numeric options here. Empty values fall back to the default."""
+    value = config.get(key)
+    if value in (None, ""):
+        return default
+    return int(value)
+
+def get_tenant_ids(config):
+    """`tenant_id` is either a single tenant, a comma separated list or a
+    list of tenants."""
+    tenant_ids = config.get("tenant_id") or []
+    if isinstance(tenant_ids, str):
+        tenant_ids = tenant_ids.split(",")
+    return [tenant_id.strip() for tenant_id in tenant_ids if tenant_id.strip()]
+
+def build_session(config):
+    """Returns a session whose connection pool holds a connection for every
+    request which may be in flight at once, that is `max_concurrent_requests`
+    per tenant unless `http_pool_size` says otherwise. GETs are retried
+    on connection errors, but not on error responses, which
+    `raise_for_error` and the backoff decorators deal with."""
+    default_pool_size = get_config_int(config, "max_concurrent_requests", CONCURRENT_LIMIT) \
+        * max(len(get_tenant_ids(config)), 1)
+    pool_size = max(get_config_int(config, "http_pool_size", default_pool_size), 1)
+    connection_retries = get_config_int(config, "connection_retries", DEFAULT_CONNECTION_RETRIES)
+    retries = Retry(total=connection_retries, connect=connection_retries, read=connection_retries,
+                    status=0, redirect=False, backoff_factor=0.5,
+                    allowed_methods=frozenset(["GET"]), raise_on_status=False)
+    adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retries)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
 def update_config_file(config, config_path):
     with open(config_path, 'w') as config_file:
         json.dump(config, config_file, indent=2)
@@ -177,15 +387,188 @@ def retry_after_wait_gen():
         LOGGER.info("API rate limit exceeded -- sleeping for %s seconds", sleep_time_str)
         yield math.floor(float(sleep_time_str))
 
+class RateLimitWindow():
+    """Tracks the calls made within a rolling window, together with the
+    remaining allowance last reported by Xero for that window."""
+    def __init__(self, limit, period):
+        self.limit = limit
+        self.period = period
+        self.sent = deque()
+        self.remaining = None
+        self.reported_at = None
+
+    def delay(self, now):
+        while self.sent and now - self.sent[0] >= self.period:
+            self.sent.popleft()
+        delay = 0
+        if len(self.sent) >= self.limit:
+            delay = self.sent[0] + self.period - now
+        if self.remaining is not None and self.remaining <= 0:
+            delay = max(delay, self.reported_at + self.period - now)
+        return delay
+
+    def record(self, now):
+        self.sent.append(now)
+        if self.remaining is not None:
+            self.remaining -= 1
+
+    def observe(self, remaining, now):
+        self.remaining = remaining
+        self.reported_at = now
+
+
+class RateLimiter():
+    """Paces requests so that the minute, app minute and day limits are
+    never exceeded, instead of waiting for a 429. A single instance is
+    shared by every thread using the client.
+
+    Usage:
+        with limiter:
+            response = session.send(...)
+        limiter.observe(response.headers)
+    """
+    def __init__(self, max_concurrent=CONCURRENT_LIMIT, clock=time_.monotonic, sleep=time_.sleep):
+        self.max_concurrent = max_concurrent
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.concurrency = threading.BoundedSemaphore(max_concurrent)
+        self.minute = RateLimitWindow(MINUTE_LIMIT, 60)
+        self.app_minute = RateLimitWindow(APP_MINUTE_LIMIT, 60)
+        self.day = RateLimitWindow(DAY_LIMIT, 24 * 60 * 60)
+
+    def for_tenant(self):
+        """Returns a limiter for another tenant. The concurrent, minute and
+        day limits apply per tenant, while the app minute window (and the
+        lock guarding it) is shared with this limiter."""
+        limiter = copy.copy(self)
+        limiter.concurrency = threading.BoundedSemaphore(self.max_concurrent)
+        limiter.minute = RateLimitWindow(MINUTE_LIMIT, 60)
+        limiter.day = RateLimitWindow(DAY_LIMIT, 24 * 60 * 60)
+        return limiter
+
+    def acquire(self):
+        self.concurrency.acquire()
+        try:
+            while True:
+                with self.lock:
+                    now = self.clock()
+                    if self.day.delay(now) > 0:
+                        raise XeroTooManyError(
+                            "HTTP-error-code: 429, Error: {}. The daily limit has been reached.".format(
+                                ERROR_CODE_EXCEPTION_MAPPING[429]["message"]))
+                    delay = max(self.minute.delay(now), self.app_minute.delay(now))
+                    if delay <= 0:
+                        for window in (self.minute, self.app_minute, self.day):
+                            window.record(now)
+                        return
+                LOGGER.info("Approaching the API rate limit -- sleeping for %.1f seconds", delay)
+                self.sleep(delay)
+        except BaseException:
+            self.concurrency.release()
+            raise
+
+    def release(self):
+        self.concurrency.release()
+
+    def observe(self, headers):
+        """Updates the windows from the limit headers of a response."""
+        if not headers:
+            return
+        with self.lock:
+            now = self.clock()
+            for header, window in (("X-MinLimit-Remaining", self.minute),
+                                   ("X-AppMinLimit-Remaining", self.app_minute),
+                                   ("X-DayLimit-Remaining", self.day)):
+                value = headers.get(header)
+                if value is not None:
+                    try:
+                        window.observe(int(value), now)
+                    except ValueError:
+                        pass
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
 class XeroClient():
     def __init__(self, config):
-        self.session = requests.Session()
+        self.session = build_session(config)
+        self.timeout = (CONNECT_TIMEOUT,
+                        get_config_int(config, "request_timeout", DEFAULT_REQUEST_TIMEOUT))
+        self.rate_limiter = RateLimiter(
+            get_config_int(config, "max_concurrent_requests", CONCURRENT_LIMIT))
         self.user_agent = config.get("user_agent")
+        self.codec = build_codec(config)
         self.tenant_id = None
         self.access_token = None
-
-    def refresh_credentials(self, config, config_path):
-
+        # Set by `configure_stream`. Streams without a record decoder are
+        # parsed with `_json_load_object_hook`.
+        self.record_decoders = {}
+        # StreamProfilers of the streams being profiled, see
+        # `Context.profile_stream`
+        self.profilers = {}
+
+    def for_tenant(self, tenant_id):
+        """Returns a client for another tenant which shares this client's
+        connection pool, access token and app wide rate limit."""
+        client = copy.copy(self)
+        client.tenant_id = tenant_id
+        client.rate_limiter = self.rate_limiter.for_tenant()
+        client.profilers = {}
+        return client
+
+    def log_pool_metrics(self):
+        """Logs, per host, how many requests were sent and how many of them
+        needed a new connection rather than reusing a pooled one."""
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                tags = {"host": pool.host}
+                new_connections = min(pool.num_connections, pool.num_requests)
+                for metric, value in (("http_pool_requests", pool.num_requests),
+                                      ("http_pool_hits", pool.num_requests - new_connections),
+                                      ("http_pool_misses", new_connections)):
+                    metrics.log(LOGGER, metrics.Point("counter", metric, value, tags))
+
+    def configure_stream(self, tap_stream_id, schema, mdata=None):
+        """Restricts the decoding of a stream's records to the fields its
+        catalog selects, and date decoding to the keys its schema declares
+        as date-time. Fields are only dropped at the top level, so nothing
+        is dropped when `mdata` deselects nested fields."""
+        dropped = get_dropped_fields(metadata.to_map(mdata)) if mdata else None
+        self.record_decoders[tap_stream_id] = make_record_decoder(schema, dropped or ())
+
+    def refresh_credentials(self, config, config_path, force=False):
+        """Sets the access token, from the token cache when one is
+        configured and holds a token which is not about to expire. `force`
+        always refreshes, as after a 401."""
+        token_cache = build_token_cache(config)
+        if token_cache is None:
+            self._refresh_access_token(config, config_path)
+            return
+
+        key = token_cache.key(config, get_tenant_ids(config))
+        with token_cache.locked():
+            access_token = None if force else token_cache.get(key)
+            if access_token:
+                LOGGER.info("Using the cached access token")
+                self.access_token = access_token
+                self.tenant_id = get_tenant_ids(config)[0]
+                return
+            expires_in = self._refresh_access_token(config, config_path)
+            token_cache.put(key, self.access_token, expires_in)
+
+    def _refresh_access_token(self, config, config_path):
+        """Exchanges the refresh token for a new access token and returns
+        the new token's lifetime in seconds, if Xero sent one."""
         header_token = b64encode((config["client_id"] + ":" + config["client_secret"]).encode('utf-8'))
 
         headers = {
@@ -197,10 +580,11 @@ class XeroClient():
             "grant_type": "refresh_token",
             "refresh_token": config["refresh_token"],
         }
-        resp = self.session.post("https://identity.xero.com/connect/token", headers=headers, data=post_body)
+        resp = self.session.post(TOKEN_URL, headers=headers, data=post_body, timeout=self.timeout)
 
         if resp.status_code != 200:
             raise_for_error(resp)
+            return None
         else:
             resp = resp.json()
 
@@ -208,7 +592,8 @@ class XeroClient():
             config['refresh_token'] = resp["refresh_token"]
             update_config_file(config, config_path)
             self.access_token = resp["access_token"]
-            self.tenant_id = config['tenant_id']
+            self.tenant_id = get_tenant_ids(config)[0]
+            return resp.get("expires_in")
 
 
     @backoff.on_exception(backoff.expo, (json.decoder.JSONDecodeError, XeroInternalError), max_tries=3)
@@ -227,18 +612,23 @@ class XeroClient():
         # Validating the authorization of the provided configuration
         currencies_url = join(BASE_URL, "Currencies")
         request = requests.Request("GET", currencies_url, headers=headers)
-        response = self.session.send(request.prepare())
+        with self.rate_limiter:
+            response = self.session.send(request.prepare(), timeout=self.timeout)
+        self.rate_limiter.observe(getattr(response, "headers", None))
 
         if response.status_code != 200:
             raise_for_error(response)
 
 
-    @backoff.on_exception(backoff.expo, (json.decoder.JSONDecodeError, XeroInternalError), max_tries=3)
-    @backoff.on_exception(retry_after_wait_gen, XeroTooManyInMinuteError, giveup=is_not_status_code_fn([429]), jitter=None, max_tries=3)
-    def filter(self, tap_stream_id, since=None, **params):
+    def _send_filter(self, tap_stream_id, since, params):
+        """Sends the request and returns the response with its body unread.
+        The concurrency permit is still held, and the caller releases it
+        once the body has been read, so that the limit covers downloads as
+        well and no more connections are open than the pool keeps."""
         xero_resource_name = tap_stream_id.title().replace("_", "")
         url = join(BASE_URL, xero_resource_name)
         headers = {"Accept": "application/json",
+                   "Accept-Encoding": ACCEPT_ENCODING,
                    "Authorization": "Bearer " + self.access_token,
                    "Xero-tenant-id": self.tenant_id}
         if self.user_agent:
@@ -247,17 +637,219 @@ class XeroClient():
             headers["If-Modified-Since"] = since
 
         request = requests.Request("GET", url, headers=headers, params=params)
-        response = self.session.send(request.prepare())
+        self.rate_limiter.acquire()
+        try:
+            # The body is always read lazily so that the time spent
+            # downloading and decompressing it can be measured separately.
+            with self.profilers.get(tap_stream_id, NULL_PROFILER).phase("http_wait"):
+                response = self.session.send(request.prepare(), stream=True, timeout=self.timeout)
+            self.rate_limiter.observe(getattr(response, "headers", None))
+
+            if response.status_code != 200:
+                raise_for_error(response)
+        except BaseException:
+            self.rate_limiter.release()
+            raise
+        return xero_resource_name, response
 
-        if response.status_code != 200:
-            raise_for_error(response)
-            return None
+    @backoff.on_exception(backoff.expo, (json.decoder.JSONDecodeError, XeroInternalError), max_tries=3)
+    @backoff.on_exception(retry_after_wait_gen, XeroTooManyInMinuteError, giveup=is_not_status_code_fn([429]), jitter=None, max_tries=3)
+    def filter(self, tap_stream_id, since=None, **params):
+        xero_resource_name, response = self._send_filter(tap_stream_id, since, params)
+        record_decoder = self.record_decoders.get(tap_stream_id)
+        decode_start = time_.perf_counter()
+        try:
+            response_text = response.text
+        finally:
+            self.rate_limiter.release()
+        parse_start = time_.perf_counter()
+        if record_decoder:
+            # Dates are converted by the record decoder, so the body can be
+            # parsed by the configured codec
+            response_meta = self.codec.loads(response_text)
         else:
-            response_meta = json.loads(response.text,
-                                    object_hook=_json_load_object_hook,
-                                    parse_float=decimal.Decimal)
-            response_body = response_meta.pop(xero_resource_name)
-            return response_body
+            response_meta = json.loads(response_text, object_hook=_json_load_object_hook,
+                                       parse_float=decimal.Decimal)
+        response_body = response_meta.pop(xero_resource_name)
+        if record_decoder:
+            for record in response_body:
+                record_decoder(record)
+        parse_end = time_.perf_counter()
+        profiler = self.profilers.get(tap_stream_id, NULL_PROFILER)
+        profiler.add("http_wait", parse_start - decode_start)
+        profiler.add("json_decode", parse_end - parse_start)
+        wire_bytes, body_bytes = _response_sizes(response)
+        log_response_metrics(tap_stream_id, response, wire_bytes, body_bytes,
+                             parse_start - decode_start, parse_end - parse_start)
+        return response_body
+
+    @backoff.on_exception(backoff.expo, XeroInternalError, max_tries=3)
+    @backoff.on_exception(retry_after_wait_gen, XeroTooManyInMinuteError, giveup=is_not_status_code_fn([429]), jitter=None, max_tries=3)
+    def filter_stream(self, tap_stream_id, since=None, **params):
+        """Like `filter`, but returns an iterator which decodes the records
+        one at a time while the response body is still being read, so the
+        whole document is never held in memory. The request itself is made
+        before this returns, so request errors are retried as usual; errors
+        in the body surface while iterating. The concurrency permit is held
+        until the body has been read, or the iterator is closed or dropped."""
+        xero_resource_name, response = self._send_filter(tap_stream_id, since, params)
+        record_decoder = self.record_decoders.get(tap_stream_id)
+        decoder = json.JSONDecoder(object_hook=None if record_decoder else _json_load_object_hook,
+                                   parse_float=decimal.Decimal)
+        release = _release_once(self.rate_limiter.release)
+        text = _iter_text(tap_stream_id, response, release)
+        records = iter_json_array(text, xero_resource_name, decoder)
+        return StreamedRecords(map(record_decoder, records) if record_decoder else records,
+                               response, release)
+
+
+def _release_once(release):
+    """Wraps `release` so that only its first call releases the permit."""
+    released = threading.Event()
+    lock = threading.Lock()
+
+    def release_once():
+        with lock:
+            if released.is_set():
+                return
+            released.set()
+        release()
+    return release_once
+
+
+class StreamedRecords():
+    """The records of a streamed response, as returned by `filter_stream`.
+    The concurrency permit is released once the body has been read. A
+    result which is not read to the end must be closed, which happens when
+    it is garbage collected at the latest, or the permit stays taken."""
+    def __init__(self, records, response, release):
+        self.records = records
+        self.response = response
+        self.release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.records)
+
+    def close(self):
+        self.release()
+        self.response.close()
+
+    def __del__(self):
+        self.close()
+
+
+def _iter_text(tap_stream_id, response, release):
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")()
+    body_bytes = 0
+    try:
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            body_bytes += len(chunk)
+            yield decoder.decode(chunk)
+    finally:
+        release()
+    yield decoder.decode(b"", final=True)
+    # Decoding and parsing are interleaved when streaming, so only the
+    # sizes are reported.
+    wire_bytes, _ = _response_sizes(response)
+    log_response_metrics(tap_stream_id, response, wire_bytes or body_bytes, body_bytes)
+
+
+def _response_sizes(response):
+    """Returns the number of bytes received over the wire and the number
+    after decompression. Either is None if the response cannot tell."""
+    # Read the cached body directly: the `content` property would try to
+    # read a streamed body a second time.
+    body = getattr(response, "_content", None)
+    body_bytes = len(body) if isinstance(body, bytes) else None
+    raw = getattr(response, "raw", None)
+    try:
+        wire_bytes = int(raw.tell())
+    except Exception:
+        wire_bytes = body_bytes
+    return wire_bytes, body_bytes
+
+
+def log_response_metrics(tap_stream_id, response, wire_bytes, body_bytes,
+                         decode_seconds=None, parse_seconds=None):
+    headers = getattr(response, "headers", None) or {}
+    tags = {metrics.Tag.endpoint: tap_stream_id,
+            "content_encoding": headers.get("Content-Encoding", "identity")}
+    points = [("counter", "http_response_wire_bytes", wire_bytes),
+              ("counter", "http_response_bytes", body_bytes),
+              ("timer", "http_response_decode_duration", decode_seconds),
+              ("timer", "json_parse_duration", parse_seconds)]
+    for metric_type, metric, value in points:
+        if value is not None:
+            metrics.log(LOGGER, metrics.Point(metric_type, metric, value, tags))
+
+
+def iter_json_array(chunks, key, decoder):
+    """Yields the elements of the array stored under `key` in a top-level
+    JSON object, decoding each one as soon as its text has arrived."""
+    state = {"buf": "", "pos": 0}
+    chunks = iter(chunks)
+
+    def read_more():
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        state["buf"] = state["buf"][state["pos"]:] + chunk
+        state["pos"] = 0
+        return True
+
+    def peek():
+        while True:
+            state["pos"] = WHITESPACE.match(state["buf"], state["pos"]).end()
+            if state["pos"] < len(state["buf"]):
+                return state["buf"][state["pos"]]
+            if not read_more():
+                raise json.JSONDecodeError("Unexpected end of data", state["buf"], state["pos"])
+
+    def expect(char):
+        if peek() != char:
+            raise json.JSONDecodeError("Expecting '{}'".format(char), state["buf"], state["pos"])
+        state["pos"] += 1
+
+    def decode_value():
+        peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(state["buf"], state["pos"])
+            except json.JSONDecodeError:
+                if not read_more():
+                    raise
+                continue
+            # A number cut off by the end of a chunk decodes as its prefix,
+            # e.g. "-1." as -1, so a value only counts as complete once the
+            # character after it ends a value
+            if (end == len(state["buf"]) or state["buf"][end] not in VALUE_DELIMITERS) \
+               and read_more():
+                continue
+            state["pos"] = end
+            return value
+
+    expect("{")
+    while peek() != "}":
+        if peek() == ",":
+            state["pos"] += 1
+        name = decode_value()
+        expect(":")
+        if name != key:
+            decode_value()
+            continue
+        expect("[")
+        while peek() != "]":
+            if peek() == ",":
+                state["pos"] += 1
+            yield decode_value()
+        # Drain the rest of the body so the connection can be reused
+        for _ in chunks:
+            pass
+        return
+    raise KeyError(key)
 
 
 def raise_for_error(resp):
@@ -0,0 +1,273 @@
+"""Compiles a stream's JSON schema into a tree of closures that apply the same
+conversions as singer's `Transformer`, without walking the schema for every
+record. Any record the compiled function cannot handle is passed to a real
+`Transformer`, so errors and edge cases behave exactly as before.
+
+A stream's `RecordPruner` is compiled into the same functions: pruned
+paths are skipped as each record is copied rather than popped beforehand,
+and nested objects which are pruned away are never transformed."""
+import decimal
+import re
+from singer import metadata, Transformer
+from singer.transform import string_to_datetime
+from .transform import EPOCH, EPOCH_SENTINEL
+
+# The object hook already normalises Xero dates to this form, which
+# `string_to_datetime` would return unchanged.
+CANONICAL_DATETIME = re.compile(r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{6}Z\Z')
+
+FAILED = (False, None)
+
+
+class CannotCompile(Exception):
+    pass
+
+
+def _transform_datetime(data):
+    if data is None or data == "":
+        return FAILED
+    if isinstance(data, str) and CANONICAL_DATETIME.match(data):
+        return True, data
+    data = string_to_datetime(data)
+    if data is None:
+        return FAILED
+    return True, data
+
+
+def _transform_decimal(data):
+    if data is None:
+        return FAILED
+    if isinstance(data, (str, float, int)):
+        try:
+            return True, str(decimal.Decimal(str(data)))
+        except Exception:
+            return FAILED
+    if isinstance(data, decimal.Decimal):
+        try:
+            if data.is_snan():
+                return True, 'NaN'
+            return True, str(data)
+        except Exception:
+            return FAILED
+    return FAILED
+
+
+def _transform_null(data):
+    if data is None or data == "":
+        return True, None
+    return FAILED
+
+
+def _transform_string(data):
+    if data is None:
+        return FAILED
+    try:
+        return True, str(data)
+    except Exception:
+        return FAILED
+
+
+def _transform_integer(data):
+    if isinstance(data, str):
+        data = data.replace(",", "")
+    try:
+        return True, int(data)
+    except Exception:
+        return FAILED
+
+
+def _transform_number(data):
+    if isinstance(data, str):
+        data = data.replace(",", "")
+    try:
+        return True, float(data)
+    except Exception:
+        return FAILED
+
+
+def _transform_boolean(data):
+    if isinstance(data, str) and data.lower() == "false":
+        return True, False
+    try:
+        return True, bool(data)
+    except Exception:
+        return FAILED
+
+
+def _untyped(data):
+    return True, data
+
+
+def _with_epoch_sentinel(transform_fn):
+    def _transform_epoch_sentinel(data):
+        if data == EPOCH_SENTINEL:
+            data = EPOCH
+        return transform_fn(data)
+    return _transform_epoch_sentinel
+
+
+def _compile_object(schema, dropped_fields=(), prune=None):
+    if schema.get("patternProperties"):
+        raise CannotCompile("patternProperties")
+    properties = schema.get("properties", {})
+    if not properties:
+        if prune is not None:
+            raise CannotCompile("pruning an object without properties")
+        def _transform_empty_object(data):
+            if not isinstance(data, dict):
+                return FAILED
+            return True, data
+        return _transform_empty_object
+
+    children = prune.children if prune is not None else {}
+    compiled = {}
+    for key, sub_schema in properties.items():
+        is_list, child = children.get(key, (False, None))
+        if is_list:
+            compiled[key] = _compile(sub_schema, prune_items=child)
+        else:
+            compiled[key] = _compile(sub_schema, prune=child)
+    for field in dropped_fields:
+        compiled.pop(field, None)
+    if prune is not None:
+        # Fields missing from `compiled` are left out of the copy
+        for field in prune.drop:
+            compiled.pop(field, None)
+        for field in prune.epoch_dates:
+            if field in compiled:
+                compiled[field] = _with_epoch_sentinel(compiled[field])
+
+    def _transform_object(data):
+        if not isinstance(data, dict):
+            return FAILED
+        result = {}
+        for key, value in data.items():
+            transform_fn = compiled.get(key)
+            if transform_fn is not None:
+                success, value = transform_fn(value)
+                if not success:
+                    return FAILED
+                result[key] = value
+        return True, result
+    return _transform_object
+
+
+def _compile_array(schema, prune_items=None):
+    item_fn = _compile(schema["items"], prune=prune_items)
+
+    def _transform_array(data):
+        if not isinstance(data, list):
+            return FAILED
+        result = []
+        for row in data:
+            success, row = item_fn(row)
+            if not success:
+                return FAILED
+            result.append(row)
+        return True, result
+    return _transform_array
+
+
+def _compile_type(typ, schema, dropped_fields=(), prune=None, prune_items=None):
+    if typ == "null":
+        return _transform_null
+    if schema.get("format") == "date-time":
+        return _transform_datetime
+    if schema.get("format") == "singer.decimal":
+        return _transform_decimal
+    # Like the `RecordPruner`, an object path does not apply to a list and
+    # a list path does not apply to an object
+    if typ == "object":
+        return _compile_object(schema, dropped_fields, prune)
+    if typ == "array":
+        return _compile_array(schema, prune_items)
+    return {
+        "string": _transform_string,
+        "integer": _transform_integer,
+        "number": _transform_number,
+        "boolean": _transform_boolean,
+    }.get(typ, lambda data: FAILED)
+
+
+def _first_success(transform_fns):
+    if len(transform_fns) == 1:
+        return transform_fns[0]
+
+    def _transform_any(data):
+        for transform_fn in transform_fns:
+            success, result = transform_fn(data)
+            if success:
+                return success, result
+        return FAILED
+    return _transform_any
+
+
+def _compile(schema, dropped_fields=(), prune=None, prune_items=None):
+    """`prune` is the `RecordPruner` node which applies to this value when
+    it is an object, and `prune_items` the one which applies to each item
+    when it is a list."""
+    pruned = prune is not None or prune_items is not None
+    if "anyOf" in schema:
+        if dropped_fields:
+            raise CannotCompile("anyOf at the top level")
+        if pruned:
+            raise CannotCompile("pruning anyOf")
+        return _first_success([_compile(sub_schema) for sub_schema in schema["anyOf"]])
+    if "type" not in schema:
+        if pruned:
+            raise CannotCompile("pruning an untyped value")
+        return _untyped
+    types = schema["type"]
+    if not isinstance(types, list):
+        types = [types]
+    # Like the Transformer, 'null' is always tried last
+    types = [typ for typ in types if typ != "null"] + [typ for typ in types if typ == "null"]
+    return _first_success([_compile_type(typ, schema, dropped_fields, prune, prune_items) for typ in types])
+
+
+def get_dropped_fields(mdata_map):
+    """Returns the top level fields the metadata filters out, or None when
+    the metadata filters nested fields, which the compiled path does not
+    handle."""
+    dropped = set()
+    for breadcrumb, mdata in mdata_map.items():
+        if not breadcrumb or mdata.get("inclusion") == "automatic":
+            continue
+        if mdata.get("selected") is False or mdata.get("inclusion") == "unsupported":
+            if len(breadcrumb) != 2:
+                return None
+            dropped.add(breadcrumb[1])
+    return dropped
+
+
+class RecordTransformer():
+    """Transforms the records of one stream, first applying the stream's
+    `RecordPruner` if it has one. The schema, metadata map and
+    `Transformer` are set up once per sync rather than once per record."""
+    def __init__(self, schema, mdata, pruner=None):
+        self.schema = schema
+        self.metadata = metadata.to_map(mdata)
+        self.transformer = Transformer()
+        self.pruner = pruner
+        dropped_fields = get_dropped_fields(self.metadata)
+        prune = pruner.tree if pruner is not None else None
+        try:
+            self.compiled = _compile(schema, dropped_fields, prune) if dropped_fields is not None else None
+        except CannotCompile:
+            self.compiled = None
+
+    def transform(self, record):
+        if self.compiled is not None:
+            success, result = self.compiled(record)
+            if success:
+                return result
+        # Fall back to the Transformer for anything the compiled function
+        # rejects so that the SchemaMismatch raised is the usual one. The
+        # compiled function does not modify the record, so it still needs
+        # pruning.
+        if self.pruner is not None:
+            self.pruner([record])
+        return self.transformer.transform(record, self.schema, self.metadata)
+
+    def log_warning(self):
+        self.transformer.log_warning()
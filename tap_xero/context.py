@@ -1,6 +1,16 @@
-import singer
+import contextlib
+import copy
+import threading
 from singer import bookmarks as bks_
 from .client import XeroClient
+from .compiled_transform import RecordTransformer
+from .output import build_writer
+from .profiling import NULL_PROFILER, StreamProfiler
+
+
+class SyncStopped(Exception):
+    """Raised in place of the next request of a stream once another stream
+    or tenant of the run has failed."""
 
 
 class Context():
@@ -10,35 +20,145 @@ class Context():
         self.state = state
         self.catalog = catalog
         self.client = XeroClient(config)
+        # Set on the per tenant contexts of a multi-tenant sync, see
+        # `for_tenant`.
+        self.tenant_id = None
+        self._root_client = self.client
+        self._root_state = state
+        self.writer = build_writer(config)
+        # Streams may be synced from several worker threads, so every
+        # mutation of the state and every message written to stdout goes
+        # through this lock.
+        self.lock = threading.RLock()
+        self._credentials_lock = threading.Lock()
+        # Set when a stream or tenant fails, so that the others stop at
+        # their next request rather than run to the end. Shared by the
+        # per tenant contexts.
+        self.stopped = threading.Event()
+        self._record_transformers = {}
+        self._profilers = {}
+
+    def for_tenant(self, tenant_id):
+        """Returns a context for one tenant of a multi-tenant sync. It shares
+        the config, catalog, writer, locks and connection pool with this
+        context, and keeps its bookmarks under `state["tenants"][tenant_id]`."""
+        tenant_ctx = copy.copy(self)
+        tenant_ctx.tenant_id = tenant_id
+        tenant_ctx.client = self._root_client.for_tenant(tenant_id)
+        tenant_ctx._profilers = {}
+        with self.lock:
+            tenants = self._root_state.setdefault("tenants", {})
+            tenant_ctx.state = tenants.setdefault(tenant_id, {})
+        return tenant_ctx
 
-    def refresh_credentials(self):
-        self.client.refresh_credentials(self.config, self.config_path)
+    def refresh_credentials(self, force=False):
+        with self._credentials_lock:
+            # All tenants share one access token. Only refresh it if no
+            # other tenant has done so since this client last copied it.
+            stale_token = self.client.access_token
+            if self.client is self._root_client or stale_token == self._root_client.access_token:
+                self._root_client.refresh_credentials(self.config, self.config_path, force=force)
+            self.client.access_token = self._root_client.access_token
+
+    def check_stopped(self):
+        if self.stopped.is_set():
+            raise SyncStopped("Stopped because another part of the sync failed")
 
     def check_platform_access(self):
         self.client.check_platform_access(self.config, self.config_path)
 
+    def get_record_transformer(self, tap_stream_id, pruner=None):
+        """Returns the transformer for a stream, built from the catalog and
+        the stream's `pruner` the first time it is needed during this
+        sync."""
+        with self.lock:
+            if tap_stream_id not in self._record_transformers:
+                stream = self.catalog.get_stream(tap_stream_id)
+                self._record_transformers[tap_stream_id] = RecordTransformer(
+                    stream.schema.to_dict(), stream.metadata, pruner)
+            return self._record_transformers[tap_stream_id]
+
+    def get_profiler(self, tap_stream_id):
+        return self._profilers.get(tap_stream_id, NULL_PROFILER)
+
+    @contextlib.contextmanager
+    def profile_stream(self, tap_stream_id):
+        """Times the phases of a stream's sync when `profile_streams` is set,
+        and logs them as metrics once it is done. With `profile_dir`, the
+        sync is also run under cProfile and the stats are dumped there."""
+        profile_phases = self.config.get("profile_streams") in ["true", True]
+        profile_dir = self.config.get("profile_dir")
+        if not profile_phases and not profile_dir:
+            yield
+            return
+
+        profiler = StreamProfiler(tap_stream_id, self.tenant_id)
+        if profile_phases:
+            self._profilers[tap_stream_id] = profiler
+            self.client.profilers[tap_stream_id] = profiler
+        if profile_dir:
+            profiler.start_cprofile()
+        try:
+            yield
+        finally:
+            if profile_dir:
+                profiler.dump_cprofile(profile_dir)
+            if profile_phases:
+                self._profilers.pop(tap_stream_id, None)
+                self.client.profilers.pop(tap_stream_id, None)
+                profiler.log_metrics()
+
     def get_bookmark(self, path):
-        return bks_.get_bookmark(self.state, *path)
+        with self.lock:
+            return bks_.get_bookmark(self.state, *path)
 
     def set_bookmark(self, path, val):
-        bks_.write_bookmark(self.state, path[0], path[1], val)
+        with self.lock:
+            bks_.write_bookmark(self.state, path[0], path[1], val)
 
     def get_offset(self, path):
-        off = bks_.get_offset(self.state, path[0])
-        return (off or {}).get(path[1])
+        with self.lock:
+            off = bks_.get_offset(self.state, path[0])
+            return (off or {}).get(path[1])
 
     def set_offset(self, path, val):
-        bks_.set_offset(self.state, path[0], path[1], val)
+        with self.lock:
+            bks_.set_offset(self.state, path[0], path[1], val)
 
     def clear_offsets(self, tap_stream_id):
-        bks_.clear_offset(self.state, tap_stream_id)
+        with self.lock:
+            bks_.clear_offset(self.state, tap_stream_id)
 
     def update_start_date_bookmark(self, path):
-        val = self.get_bookmark(path)
-        if not val:
-            val = self.config["start_date"]
-            self.set_bookmark(path, val)
-        return val
+        with self.lock:
+            val = self.get_bookmark(path)
+            if not val:
+                val = self.config["start_date"]
+                self.set_bookmark(path, val)
+            return val
+
+    def get_syncing_streams(self):
+        """Streams that were in flight when the previous run stopped. The
+        legacy single `currently_syncing` value is honoured as well."""
+        with self.lock:
+            syncing = list(self.state.get("syncing_streams") or [])
+            currently_syncing = self.state.get("currently_syncing")
+            if currently_syncing and currently_syncing not in syncing:
+                syncing.insert(0, currently_syncing)
+            return syncing
+
+    def mark_syncing(self, tap_stream_id):
+        with self.lock:
+            syncing = self.state.setdefault("syncing_streams", [])
+            if tap_stream_id not in syncing:
+                syncing.append(tap_stream_id)
+
+    def mark_synced(self, tap_stream_id):
+        with self.lock:
+            syncing = self.state.get("syncing_streams") or []
+            if tap_stream_id in syncing:
+                syncing.remove(tap_stream_id)
 
     def write_state(self):
-        singer.write_state(self.state)
+        with self.lock:
+            self.writer.write_state(self._root_state)
@@ -0,0 +1,108 @@
+"""Picks the JSON library which decodes response bodies and encodes RECORD
+messages, from the `json_backend` config value:
+
+stdlib -- `json` with Decimal floats, and singer's message formatting. The
+          default, and the fallback for anything the others cannot handle
+orjson -- faster C libraries, imported only when they are asked for
+ujson
+auto   -- the first of orjson and ujson which is installed, else stdlib
+
+The C libraries decode numbers with a fraction as floats, which hold
+Xero's amounts exactly but drop trailing zeros, so "40.00" is written as
+"40.0". A body which may contain a number too long for a float to hold
+exactly is decoded by `json` instead. Dates are left as Xero sends them,
+for the client's record decoder to convert."""
+import decimal
+import functools
+import importlib
+import importlib.util
+import json
+import re
+import singer
+from singer.messages import format_message, RecordMessage
+
+LOGGER = singer.get_logger()
+
+DEFAULT_BACKEND = "stdlib"
+FAST_BACKENDS = ("orjson", "ujson")
+
+# A float holds 15 significant digits exactly, so a number can only lose
+# digits if it has at least 8 on one side of its point. The pattern starts
+# with the point so that it scans as fast as a plain search for it. Strings
+# which look like such numbers only cost a slower decode.
+LONG_NUMBER_PATTERN = re.compile(r'\.(?:\d{8}|(?<=\d{8}\.))')
+
+
+class StdlibCodec():
+    name = "stdlib"
+
+    def loads(self, text):
+        return json.loads(text, parse_float=decimal.Decimal)
+
+    def record_lines(self, stream_name, records):
+        return [format_message(RecordMessage(stream=stream_name, record=record))
+                for record in records]
+
+    def __reduce__(self):
+        return get_codec, (self.name,)
+
+
+class FastCodec(StdlibCodec):
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self._loads = loads
+        self._dumps = dumps
+
+    def loads(self, text):
+        if LONG_NUMBER_PATTERN.search(text):
+            return super().loads(text)
+        try:
+            return self._loads(text)
+        except ValueError:
+            # Let `json` raise the usual JSONDecodeError, or decode what the
+            # C library refused, such as integers beyond 64 bits
+            return super().loads(text)
+
+    def record_lines(self, stream_name, records):
+        # The envelope is written as singer writes it, so that only the
+        # records themselves are encoded differently
+        prefix = '{"type": "RECORD", "stream": ' + json.dumps(stream_name) + ', "record": '
+        lines = []
+        for record in records:
+            try:
+                lines.append(prefix + self._dumps(record) + "}")
+            except (TypeError, ValueError, OverflowError):
+                # Decimals and other values only singer can encode
+                lines.extend(super().record_lines(stream_name, [record]))
+        return lines
+
+
+def _build_fast_codec(name):
+    module = importlib.import_module(name)
+    if name == "orjson":
+        return FastCodec(name, module.loads, lambda value: module.dumps(value).decode("utf-8"))
+    return FastCodec(name, module.loads,
+                     functools.partial(module.dumps, escape_forward_slashes=False))
+
+
+@functools.lru_cache(maxsize=None)
+def get_codec(name):
+    if name == DEFAULT_BACKEND:
+        return StdlibCodec()
+    if name == "auto":
+        for backend in FAST_BACKENDS:
+            if importlib.util.find_spec(backend) is not None:
+                return get_codec(backend)
+        return get_codec(DEFAULT_BACKEND)
+    if name not in FAST_BACKENDS:
+        raise ValueError("json_backend must be one of auto, stdlib, {}, got {}".format(
+            ", ".join(FAST_BACKENDS), name))
+    try:
+        return _build_fast_codec(name)
+    except ImportError:
+        LOGGER.warning("json_backend %s is not installed, using stdlib json", name)
+        return StdlibCodec()
+
+
+def build_codec(config):
+    return get_codec(config.get("json_backend") or DEFAULT_BACKEND)
@@ -0,0 +1,92 @@
+import sys
+import time
+import threading
+from singer.messages import format_message, SchemaMessage, StateMessage
+from .client import get_config_int
+from .json_codec import build_codec, get_codec, DEFAULT_BACKEND
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+def serialize_records(stream_name, records, codec=None):
+    return (codec or get_codec(DEFAULT_BACKEND)).record_lines(stream_name, records)
+
+
+class MessageWriter():
+    """Buffers Singer messages and writes them to stdout in large chunks
+    rather than one write and flush per record.
+
+    STATE messages are coalesced: only the latest one is kept, and it is
+    written at the end of the next flush, after every record that was
+    buffered before it. A target therefore never sees a STATE before the
+    records it covers."""
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL, codec=None):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.codec = codec
+        self.lock = threading.Lock()
+        self._lines = []
+        self._size = 0
+        self._state_line = None
+        self._last_flush = time.monotonic()
+
+    def write_records(self, stream_name, records):
+        # Records are serialized before taking the lock so that several
+        # streams can encode their pages at the same time.
+        self.write_lines(serialize_records(stream_name, records, self.codec))
+
+    def write_lines(self, lines):
+        """Writes RECORD messages which were already serialized, for example
+        by a transform worker."""
+        with self.lock:
+            self._lines.extend(lines)
+            self._size += sum(len(line) + 1 for line in lines)
+            self._maybe_flush()
+
+    def write_record(self, stream_name, record):
+        self.write_records(stream_name, [record])
+
+    def write_state(self, state):
+        line = format_message(StateMessage(value=state))
+        with self.lock:
+            self._state_line = line
+            self._maybe_flush()
+
+    def write_schema(self, stream_name, schema, key_properties):
+        line = format_message(SchemaMessage(stream=stream_name,
+                                            schema=schema,
+                                            key_properties=key_properties))
+        with self.lock:
+            self._lines.append(line)
+            self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _maybe_flush(self):
+        if self._size >= self.buffer_size \
+           or time.monotonic() - self._last_flush >= self.flush_interval:
+            self._flush()
+
+    def _flush(self):
+        if self._state_line is not None:
+            self._lines.append(self._state_line)
+            self._state_line = None
+        if self._lines:
+            sys.stdout.write("\n".join(self._lines) + "\n")
+            sys.stdout.flush()
+        self._lines = []
+        self._size = 0
+        self._last_flush = time.monotonic()
+
+
+def build_writer(config):
+    """Returns a writer for the configured buffer size. An
+    output_buffer_size of 0 writes every message as soon as it arrives."""
+    buffer_size = get_config_int(config, "output_buffer_size", DEFAULT_BUFFER_SIZE)
+    codec = build_codec(config)
+    if buffer_size <= 0:
+        return MessageWriter(buffer_size=0, flush_interval=0, codec=codec)
+    return MessageWriter(buffer_size=buffer_size, codec=codec)
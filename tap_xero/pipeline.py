@@ -0,0 +1,150 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent import futures
+from .compiled_transform import RecordTransformer
+from .output import serialize_records
+
+DEFAULT_DEPTH = 4
+
+TransformedPage = namedtuple("TransformedPage", ["record_count", "last_bookmark", "lines", "durations"])
+
+# The transformer of a transform process, built once by `_init_process`
+_process_transformer = None
+
+
+def transform_page(transformer, format_fn, stream_name, bookmark_key, extra_fields, codec, records):
+    """Formats, transforms and serializes one page of records with `codec`.
+    Each record gets `extra_fields`, and each step is timed. The bookmark of
+    the last record is read after formatting, as `sync_pages` does."""
+    records = records or []
+    format_start = time.perf_counter()
+    format_fn(records)
+    transform_start = time.perf_counter()
+    transformed = [transformer.transform(record) for record in records]
+    if extra_fields:
+        for record in transformed:
+            record.update(extra_fields)
+    serialize_start = time.perf_counter()
+    lines = serialize_records(stream_name, transformed, codec)
+    durations = {"format": transform_start - format_start,
+                 "transform": serialize_start - transform_start,
+                 "write": time.perf_counter() - serialize_start}
+    last_bookmark = records[-1][bookmark_key] if records and bookmark_key else None
+    return TransformedPage(len(records), last_bookmark, lines, durations)
+
+
+def _init_process(schema, mdata, pruner):
+    global _process_transformer # pylint: disable=global-statement
+    _process_transformer = RecordTransformer(schema, mdata, pruner)
+
+
+def _transform_page_in_process(*args):
+    return transform_page(_process_transformer, *args)
+
+
+class _Failure():
+    def __init__(self, exc):
+        self.exc = exc
+
+
+class PagePipeline():
+    """Runs the pages of a stream through three stages connected by a
+    bounded queue, so that network I/O, transforming and writing overlap:
+
+    fetch     -- a thread requests pages in order through `pages`, and stops
+                 after the first short page
+    transform -- `transform_page` runs on a single worker thread, or on a
+                 pool of `processes` worker processes for CPU heavy pages
+    emit      -- iterating the pipeline yields `(page_num, TransformedPage)`
+                 in page order on the calling thread
+
+    At most `depth` pages are held between the fetch and emit stages.
+
+    `transform_args` are the arguments of `transform_page` after the
+    transformer. Worker processes build their own transformer from
+    `catalog_entry` and the transformer's pruner, as the compiled one
+    cannot be pickled.
+
+    Usage:
+        with PagePipeline(pages, first_page, page_size, transformer, transform_args) as pipeline:
+            for page_num, page in pipeline:
+                ...
+    """
+    def __init__(self, pages, first_page, page_size, transformer, transform_args,
+                 depth=DEFAULT_DEPTH, processes=0, catalog_entry=None):
+        self.pages = pages
+        self.first_page = first_page
+        self.page_size = page_size
+        self.queue = queue.Queue(maxsize=max(depth, 1))
+        self.stopped = threading.Event()
+        if processes > 0:
+            # Worker processes are spawned rather than forked, as forking
+            # a process with other threads running can deadlock.
+            import multiprocessing # pylint: disable=import-outside-toplevel
+            self.executor = futures.ProcessPoolExecutor(
+                max_workers=processes, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process,
+                initargs=(catalog_entry.schema.to_dict(), catalog_entry.metadata, transformer.pruner))
+            self.transform_fn = _transform_page_in_process
+            self.transform_args = tuple(transform_args)
+        else:
+            self.executor = futures.ThreadPoolExecutor(max_workers=1)
+            self.transform_fn = transform_page
+            self.transform_args = (transformer,) + tuple(transform_args)
+        self.fetcher = threading.Thread(target=self._fetch, daemon=True)
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _fetch(self):
+        page_num = self.first_page
+        try:
+            while not self.stopped.is_set():
+                records = self.pages.get(page_num)
+                future = self.executor.submit(self.transform_fn, *self.transform_args, records)
+                if not self._put((page_num, future)):
+                    return
+                if not records or len(records) < self.page_size:
+                    break
+                page_num += 1
+            self._put(None)
+        except Exception as exc: # pylint: disable=broad-except
+            self._put(_Failure(exc))
+
+    def __iter__(self):
+        self.fetcher.start()
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if isinstance(item, _Failure):
+                raise item.exc
+            page_num, future = item
+            yield page_num, future.result()
+
+    def close(self):
+        self.stopped.set()
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, tuple):
+                item[1].cancel()
+        if self.fetcher.is_alive():
+            self.fetcher.join()
+        self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
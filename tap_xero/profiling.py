@@ -0,0 +1,100 @@
+import cProfile
+import os
+import threading
+import time
+import singer
+from singer import metrics
+
+LOGGER = singer.get_logger()
+
+
+class _Phase():
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+
+
+class StreamProfiler():
+    """Adds up the time one stream's sync spends in each phase of its hot
+    path:
+
+    http_wait   -- sending the request and downloading the body
+    json_decode -- parsing the body, including the date hook
+    format      -- the stream's format_fn
+    transform   -- the schema transform
+    write       -- serializing and writing messages to stdout
+
+    Phases may be timed from several threads at once, as shards and
+    prefetched pages are."""
+    def __init__(self, tap_stream_id, tenant_id=None):
+        self.tap_stream_id = tap_stream_id
+        self.tenant_id = tenant_id
+        self.lock = threading.Lock()
+        self.durations = {}
+        self.profile = None
+
+    def add(self, phase, seconds):
+        with self.lock:
+            self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def start_cprofile(self):
+        """Profiles the calling thread until `dump_cprofile`. Threads the
+        stream starts, such as page prefetchers, are not included."""
+        self.profile = cProfile.Profile()
+        try:
+            self.profile.enable()
+        except ValueError as exc:
+            # Only one profiler can be active at a time on Python 3.12+
+            LOGGER.warning("Not profiling %s: %s", self.tap_stream_id, exc)
+            self.profile = None
+
+    def dump_cprofile(self, profile_dir):
+        if self.profile is None:
+            return
+        self.profile.disable()
+        name = self.tap_stream_id if not self.tenant_id else "{}-{}".format(self.tenant_id, self.tap_stream_id)
+        path = os.path.join(profile_dir, "{}.prof".format(name))
+        self.profile.dump_stats(path)
+        LOGGER.info("Wrote profile of %s to %s", self.tap_stream_id, path)
+
+    def log_metrics(self):
+        """Logs one `stream_phase_duration` point per phase, with the total
+        over the whole sync. Pages are not timed separately: the client
+        times requests by stream only, and prefetched pages and shards
+        overlap, so a per-page split would not add up to the stream."""
+        tags = {metrics.Tag.endpoint: self.tap_stream_id}
+        if self.tenant_id:
+            tags["tenant_id"] = self.tenant_id
+        for phase, seconds in sorted(self.durations.items()):
+            metrics.log(LOGGER, metrics.Point("timer", "stream_phase_duration", seconds,
+                                              dict(tags, phase=phase)))
+
+
+class NullProfiler():
+    """Stands in for a StreamProfiler when profiling is off, so that the
+    hot path never has to check."""
+    def add(self, phase, seconds):
+        pass
+
+    def phase(self, name):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
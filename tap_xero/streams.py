@@ -1,22 +1,62 @@
-from requests.exceptions import HTTPError
+from collections import OrderedDict
+from concurrent import futures
+import hashlib
+import json
+import threading
 import singer
-from singer import metadata, metrics, Transformer
-from singer.utils import strptime_with_tz
+from singer import metadata
+from singer import metrics
+from singer import utils
+from singer.utils import strptime_to_utc, strptime_with_tz
 import backoff
 from . import transform
+from .client import get_config_int, XeroError, XeroNotAvailableError, XeroUnauthorizedError
+from .compiled_transform import get_dropped_fields
+from .json_codec import build_codec
 
 LOGGER = singer.get_logger()
 FULL_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+RECORD_BATCH_SIZE = 100
+# Added to every record when several tenants are synced by one process
+TENANT_ID_KEY = "TenantID"
+# Marks the records of a FULL_TABLE stream which are no longer returned
+DELETED_AT_KEY = "_sdc_deleted_at"
+RECORD_KEY_SEPARATOR = "\x1f"
+# The heavy fields which Xero leaves out of invoices requested with
+# summaryOnly=true
+INVOICE_SUMMARY_OMITS = frozenset(["LineItems", "Payments", "Prepayments", "Overpayments", "CreditNotes"])
 
 
-def _request_with_timer(tap_stream_id, xero, filter_options):
+def _xero_datetime(value):
+    return "DateTime({})".format(value.strftime("%Y,%m,%d,%H,%M,%S"))
+
+
+def _no_format(records):
+    return records
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _request_with_timer(tap_stream_id, xero, filter_options, stream_response=False):
+    filter_fn = xero.filter_stream if stream_response else xero.filter
     with metrics.http_request_timer(tap_stream_id) as timer:
         try:
-            resp = xero.filter(tap_stream_id, **filter_options)
+            resp = filter_fn(tap_stream_id, **filter_options)
             timer.tags[metrics.Tag.http_status_code] = 200
             return resp
-        except HTTPError as e:
-            timer.tags[metrics.Tag.http_status_code] = e.response.status_code
+        except XeroError as e:
+            if e.response is not None:
+                timer.tags[metrics.Tag.http_status_code] = e.response.status_code
             raise
 
 
@@ -28,29 +68,67 @@ class RateLimitException(Exception):
                       RateLimitException,
                       max_tries=10,
                       factor=2)
-def _make_request(ctx, tap_stream_id, filter_options=None, attempts=0):
+def _make_request(ctx, tap_stream_id, filter_options=None, attempts=0, stream_response=False):
     filter_options = filter_options or {}
+    # Every page is fetched here, so a failure elsewhere in the run stops
+    # the stream before its next page.
+    ctx.check_stopped()
     try:
-        return _request_with_timer(tap_stream_id, ctx.client, filter_options)
-    except HTTPError as e:
-        if e.response.status_code == 401:
-            if attempts == 1:
-                raise Exception("Received Not Authorized response after credential refresh.") from e
-            ctx.refresh_credentials()
-            return _make_request(ctx, tap_stream_id, filter_options, attempts + 1)
-
-        if e.response.status_code == 503:
-            raise RateLimitException() from e
-
-        raise
+        return _request_with_timer(tap_stream_id, ctx.client, filter_options, stream_response)
+    except XeroUnauthorizedError as e:
+        if attempts == 1:
+            raise Exception("Received Not Authorized response after credential refresh.") from e
+        # The token may have been revoked or taken from a stale cache
+        ctx.refresh_credentials(force=True)
+        return _make_request(ctx, tap_stream_id, filter_options, attempts + 1, stream_response)
+    except XeroNotAvailableError as e:
+        raise RateLimitException() from e
     assert False
 
 
+class PagePrefetcher():
+    """Keeps up to `depth` page requests in flight ahead of the page being
+    processed. Pages are still handed out strictly in order, and `close`
+    cancels whatever has not been started yet."""
+    def __init__(self, fetch_fn, first_page, depth):
+        self.fetch_fn = fetch_fn
+        self.depth = depth
+        self.next_page = first_page
+        self.in_flight = OrderedDict()
+        self.executor = futures.ThreadPoolExecutor(max_workers=depth) if depth > 1 else None
+
+    def get(self, page_num):
+        if self.executor is None:
+            return self.fetch_fn(page_num)
+        while self.next_page < page_num + self.depth:
+            self.in_flight[self.next_page] = self.executor.submit(self.fetch_fn, self.next_page)
+            self.next_page += 1
+        return self.in_flight.pop(page_num).result()
+
+    def close(self):
+        for future in self.in_flight.values():
+            future.cancel()
+        self.in_flight.clear()
+        if self.executor:
+            self.executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
 class Stream():
     def __init__(self, tap_stream_id, pk_fields, bookmark_key="UpdatedDateUTC", format_fn=None):
         self.tap_stream_id = tap_stream_id
         self.pk_fields = pk_fields
-        self.format_fn = format_fn or (lambda x: x)
+        # A RecordPruner is applied by the stream's RecordTransformer as it
+        # transforms each record, rather than in a pass of its own
+        self.pruner = format_fn if isinstance(format_fn, transform.RecordPruner) else None
+        # A module level function rather than a lambda, so that it can be
+        # sent to transform processes
+        self.format_fn = format_fn if format_fn and not self.pruner else _no_format
         self.bookmark_key = bookmark_key
         self.replication_method = "INCREMENTAL"
         self.filter_options = {}
@@ -59,61 +137,274 @@ class Stream():
         with metrics.record_counter(self.tap_stream_id) as counter:
             counter.increment(len(records))
 
-    def write_records(self, records, ctx):
-        stream = ctx.catalog.get_stream(self.tap_stream_id)
-        schema = stream.schema.to_dict()
-        mdata = stream.metadata
-        for rec in records:
-            with Transformer() as transformer:
-                rec = transformer.transform(rec, schema, metadata.to_map(mdata))
-                singer.write_record(self.tap_stream_id, rec)
+    def extra_properties(self, ctx):
+        """Properties this stream adds to its records beyond those in its
+        schema file."""
+        return {}
+
+    def format_records(self, records, ctx):
+        with ctx.get_profiler(self.tap_stream_id).phase("format"):
+            self.format_fn(records)
+
+    def transform_records(self, records, ctx):
+        transformer = ctx.get_record_transformer(self.tap_stream_id, self.pruner)
+        with ctx.get_profiler(self.tap_stream_id).phase("transform"):
+            transformed = [transformer.transform(rec) for rec in records]
+        if ctx.tenant_id:
+            for rec in transformed:
+                rec[TENANT_ID_KEY] = ctx.tenant_id
+        return transformed
+
+    def emit_records(self, records, ctx):
+        with ctx.get_profiler(self.tap_stream_id).phase("write"):
+            ctx.writer.write_records(self.tap_stream_id, records)
         self.metrics(records)
 
+    def write_records(self, records, ctx):
+        self.emit_records(self.transform_records(records, ctx), ctx)
+
+    def write_batches(self, records, ctx):
+        """Formats and writes records from any iterable, a batch at a time, so
+        that a streamed response is never held in memory in full. Returns
+        the largest bookmark value written, if the stream has one."""
+        max_bookmark_value = None
+        for batch in _batches(records, RECORD_BATCH_SIZE):
+            self.format_records(batch, ctx)
+            self.write_records(batch, ctx)
+            if self.bookmark_key:
+                batch_max = max(record[self.bookmark_key] for record in batch)
+                if max_bookmark_value is None or batch_max > max_bookmark_value:
+                    max_bookmark_value = batch_max
+        return max_bookmark_value
+
+    @staticmethod
+    def stream_responses(ctx):
+        return ctx.config.get("stream_responses") in ["true", True]
+
 
 class BookmarkedStream(Stream):
     def sync(self, ctx):
         bookmark = [self.tap_stream_id, self.bookmark_key]
         start = ctx.update_start_date_bookmark(bookmark)
-        records = _make_request(ctx, self.tap_stream_id, dict(since=start))
-        if records:
-            self.format_fn(records)
-            self.write_records(records, ctx)
-            max_bookmark_value = max([record[self.bookmark_key] for record in records]) # pylint: disable=consider-using-generator
+        records = _make_request(ctx, self.tap_stream_id, dict(since=start),
+                                stream_response=self.stream_responses(ctx))
+        max_bookmark_value = self.write_batches(records or [], ctx)
+        if max_bookmark_value is not None:
             ctx.set_bookmark(bookmark, max_bookmark_value)
             ctx.write_state()
 
 
 class PaginatedStream(Stream):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, supports_page_size=True, supports_where=True, summary_omits=frozenset(), **kwargs):
         super().__init__(*args, **kwargs)
+        self.supports_page_size = supports_page_size
+        self.supports_where = supports_where
+        self.summary_omits = summary_omits
+
+    def use_summary_only(self, ctx):
+        """With `summary_only_requests`, asks Xero for the summary form of
+        the records when the catalog deselects every field it omits."""
+        if not self.summary_omits or ctx.config.get("summary_only_requests") not in ["true", True]:
+            return False
+        dropped = get_dropped_fields(metadata.to_map(ctx.catalog.get_stream(self.tap_stream_id).metadata))
+        return dropped is not None and self.summary_omits <= dropped
+
+    def get_page_size(self, ctx):
+        """Returns the configured `page_size` for this stream, or None to use
+        Xero's default of 100. The config value is either a single size or
+        an object of sizes keyed by stream."""
+        page_size = ctx.config.get("page_size")
+        if isinstance(page_size, dict):
+            page_size = page_size.get(self.tap_stream_id)
+        if not self.supports_page_size or page_size in (None, ""):
+            return None
+        page_size = int(page_size)
+        if not 1 <= page_size <= MAX_PAGE_SIZE:
+            raise ValueError("page_size must be between 1 and {}, got {}".format(MAX_PAGE_SIZE, page_size))
+        return page_size
+
+    def get_backfill_shards(self, ctx, bookmark):
+        """On the first sync of a stream, splits [start_date, now] into
+        `backfill_shards` date ranges which are fetched in parallel. The
+        shards are kept in the stream's offset, so an interrupted backfill
+        resumes each shard where it stopped. Streams whose endpoint takes
+        no `where` filter are never sharded."""
+        if not self.supports_where:
+            return None
+        shards = ctx.get_offset([self.tap_stream_id, "shards"])
+        if shards:
+            return shards
+        shard_count = get_config_int(ctx.config, "backfill_shards", 1)
+        if shard_count <= 1 or ctx.get_bookmark(bookmark) is not None:
+            return None
+
+        start = strptime_to_utc(ctx.config["start_date"])
+        step = (utils.now() - start) / shard_count
+        bounds = [start + step * i for i in range(shard_count)] + [None]
+        shards = []
+        for lower, upper in zip(bounds, bounds[1:]):
+            where = "{}>={}".format(self.bookmark_key, _xero_datetime(lower))
+            # The last shard is left open so that records updated while
+            # the backfill runs are not missed.
+            if upper:
+                where += "&&{}<{}".format(self.bookmark_key, _xero_datetime(upper))
+            shards.append({"where": where, "page": 1, "max_updated": None, "done": False})
+        ctx.set_offset([self.tap_stream_id, "shards"], shards)
+        return shards
+
+    def sync_shard(self, ctx, shard, filter_options, page_size, stop):
+        filter_options = dict(filter_options, where=shard["where"])
+        page_num = shard["page"]
+        while not shard["done"] and not stop.is_set():
+            records = _make_request(ctx, self.tap_stream_id, dict(filter_options, page=page_num))
+            if records:
+                self.format_records(records, ctx)
+                self.write_records(records, ctx)
+            page_num += 1
+            with ctx.lock:
+                if records:
+                    shard["max_updated"] = records[-1][self.bookmark_key]
+                shard["page"] = page_num
+                shard["done"] = not records or len(records) < page_size
+            ctx.write_state()
 
-    def sync(self, ctx):
-        bookmark = [self.tap_stream_id, self.bookmark_key]
+    def sync_shards(self, ctx, shards, filter_options, page_size):
+        """Syncs the backfill shards in parallel and returns the largest
+        bookmark value seen across all of them. If a shard fails, the others
+        stop after their current page and the error is raised."""
+        ctx.write_state()
+        stop = threading.Event()
+        with futures.ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            submitted = [executor.submit(self.sync_shard, ctx, shard, filter_options, page_size, stop)
+                         for shard in shards]
+            try:
+                for future in futures.as_completed(submitted):
+                    future.result()
+            except BaseException:
+                stop.set()
+                raise
+        seen = [shard["max_updated"] for shard in shards if shard["max_updated"]]
+        return max(seen) if seen else None
+
+    def sync_pages(self, ctx, start, filter_options, page_size):
         offset = [self.tap_stream_id, "page"]
-        start = ctx.update_start_date_bookmark(bookmark)
         curr_page_num = ctx.get_offset(offset) or 1
+        # A saved page number only makes sense for the page size it was
+        # fetched with, so map it onto the current size when resuming.
+        saved_page_size = ctx.get_offset([self.tap_stream_id, "page_size"]) or FULL_PAGE_SIZE
+        if saved_page_size != page_size:
+            curr_page_num = (curr_page_num - 1) * saved_page_size // page_size + 1
+
+        def fetch_page(page_num):
+            return _make_request(ctx, self.tap_stream_id, dict(filter_options, page=page_num))
+
+        max_updated = start
+        prefetch_pages = get_config_int(ctx.config, "prefetch_pages", 1)
+        with PagePrefetcher(fetch_page, curr_page_num, prefetch_pages) as pages:
+            if self.pipeline_pages(ctx):
+                return self.sync_pipelined_pages(ctx, pages, curr_page_num, start, filter_options, page_size)
+            self.start_pages(ctx, curr_page_num, filter_options, page_size)
+            while True:
+                records = pages.get(curr_page_num)
+                if records:
+                    self.format_records(records, ctx)
+                    self.write_records(records, ctx)
+                    max_updated = records[-1][self.bookmark_key]
+                    self.checkpoint_page(ctx, curr_page_num + 1, max_updated)
+                if not records or len(records) < page_size:
+                    break
+                curr_page_num += 1
+        return max_updated
+
+    def start_pages(self, ctx, curr_page_num, filter_options, page_size):
+        """Saves what a page number is relative to: the page size, and the
+        `since` the pages are fetched with, which stays put while the
+        bookmark moves on."""
+        ctx.set_offset([self.tap_stream_id, "page"], curr_page_num)
+        ctx.set_offset([self.tap_stream_id, "page_size"], page_size)
+        ctx.set_offset([self.tap_stream_id, "since"], filter_options["since"])
+        ctx.write_state()
 
-        self.filter_options.update({"since": start})
+    def checkpoint_page(self, ctx, next_page_num, max_updated):
+        """Commits a page once its records have been written, as the next
+        page to fetch and the bookmark as far as the page reaches. The pages
+        are ordered by the bookmark, so a sync which loses its offset still
+        resumes from the last page written rather than from its start."""
+        ctx.set_offset([self.tap_stream_id, "page"], next_page_num)
+        ctx.set_bookmark([self.tap_stream_id, self.bookmark_key], max_updated)
+        ctx.write_state()
+
+    @staticmethod
+    def pipeline_pages(ctx):
+        return ctx.config.get("pipeline_pages") in ["true", True] \
+            or get_config_int(ctx.config, "transform_processes", 0) > 0
+
+    def sync_pipelined_pages(self, ctx, pages, curr_page_num, start, filter_options, page_size):
+        """Like `sync_pages`, but fetches, transforms and writes pages on
+        separate stages of a `PagePipeline`. The page offset only moves past
+        a page once its records have been written."""
+        # Imported here so that runs which do not pipeline pages skip it
+        from .pipeline import PagePipeline, DEFAULT_DEPTH # pylint: disable=import-outside-toplevel
+        self.start_pages(ctx, curr_page_num, filter_options, page_size)
+
+        processes = get_config_int(ctx.config, "transform_processes", 0)
+        extra_fields = {TENANT_ID_KEY: ctx.tenant_id} if ctx.tenant_id else None
+        pipeline = PagePipeline(
+            pages, curr_page_num, page_size,
+            ctx.get_record_transformer(self.tap_stream_id, self.pruner),
+            (self.format_fn, self.tap_stream_id, self.bookmark_key, extra_fields, build_codec(ctx.config)),
+            depth=get_config_int(ctx.config, "pipeline_depth", DEFAULT_DEPTH),
+            processes=processes,
+            catalog_entry=ctx.catalog.get_stream(self.tap_stream_id) if processes else None)
+
+        max_updated = start
+        profiler = ctx.get_profiler(self.tap_stream_id)
+        with pipeline:
+            for page_num, page in pipeline:
+                for phase, seconds in page.durations.items():
+                    profiler.add(phase, seconds)
+                if page.record_count:
+                    with profiler.phase("write"):
+                        ctx.writer.write_lines(page.lines)
+                    # One line is written per record
+                    self.metrics(page.lines)
+                    max_updated = page.last_bookmark
+                    self.checkpoint_page(ctx, page_num + 1, max_updated)
+        return max_updated
+
+    def get_filter_options(self, ctx, start, page_size):
+        """Builds the query parameters for one sync. The stream instances are
+        shared by every tenant and thread, so the options are never stored
+        on the stream itself."""
+        filter_options = dict(self.filter_options, since=start)
+        if page_size:
+            filter_options["pageSize"] = page_size
 
         # Xero bug causes all manual_journal records to be returned instead of
         # 100 per page when `order` is specified. `UpdatedDateUTC ASC` is the
         # default so we can safely exclude it until the bug is fixed.
         if self.tap_stream_id != "manual_journals":
-            self.filter_options.update({"order": "UpdatedDateUTC ASC"})
+            filter_options["order"] = "UpdatedDateUTC ASC"
+        if self.use_summary_only(ctx):
+            filter_options["summaryOnly"] = "true"
+        return filter_options
 
-        max_updated = start
-        while True:
-            ctx.set_offset(offset, curr_page_num)
-            ctx.write_state()
-            self.filter_options["page"] = curr_page_num
-            records = _make_request(ctx, self.tap_stream_id, self.filter_options)
-            if records:
-                self.format_fn(records)
-                self.write_records(records, ctx)
-                max_updated = records[-1][self.bookmark_key]
-            if not records or len(records) < FULL_PAGE_SIZE:
-                break
-            curr_page_num += 1
+    def sync(self, ctx):
+        bookmark = [self.tap_stream_id, self.bookmark_key]
+        shards = self.get_backfill_shards(ctx, bookmark)
+        start = ctx.update_start_date_bookmark(bookmark)
+        # An interrupted sync resumes the pages it was fetching, which were
+        # numbered from the bookmark it started with
+        since = ctx.get_offset([self.tap_stream_id, "since"]) or start
+
+        page_size = self.get_page_size(ctx)
+        filter_options = self.get_filter_options(ctx, since, page_size)
+        page_size = page_size or FULL_PAGE_SIZE
+
+        if shards:
+            max_updated = self.sync_shards(ctx, shards, filter_options, page_size) or start
+        else:
+            max_updated = self.sync_pages(ctx, start, filter_options, page_size)
         ctx.clear_offsets(self.tap_stream_id)
         ctx.set_bookmark(bookmark, max_updated)
         ctx.write_state()
@@ -123,26 +414,36 @@ class Contacts(PaginatedStream):
     def __init__(self, *args, **kwargs):
         super().__init__("contacts", ["ContactID"], format_fn=transform.format_contacts, *args, **kwargs)
 
-    def sync(self, ctx):
+    def get_filter_options(self, ctx, start, page_size):
+        filter_options = super().get_filter_options(ctx, start, page_size)
         # Parameter to collect archived contacts from the Xero platform
         if ctx.config.get("include_archived_contacts") in ["true", True]:
-            self.filter_options.update({'includeArchived': "true"})
-
-        super().sync(ctx)
+            filter_options['includeArchived'] = "true"
+        return filter_options
 
 
 class Journals(Stream):
     """The Journals endpoint is a special case. It has its own way of ordering
     and paging the data. See
-    https://developer.xero.com/documentation/api/journals"""
+    https://developer.xero.com/documentation/api/journals
+
+    Each request returns the journals numbered after `offset`, and journal
+    numbers are dense and increasing. With `journal_partitions` > 1 the
+    numbers are split into windows of FULL_PAGE_SIZE which are fetched in
+    parallel. Windows are still written in order, and the bookmark only
+    moves past a window once it has been written."""
     def sync(self, ctx):
         bookmark = [self.tap_stream_id, self.bookmark_key]
         journal_number = ctx.get_bookmark(bookmark) or 0
+        partitions = get_config_int(ctx.config, "journal_partitions", 1)
+        if partitions > 1:
+            self.sync_windows(ctx, journal_number, partitions)
+            return
         while True:
             filter_options = {"offset": journal_number}
             records = _make_request(ctx, self.tap_stream_id, filter_options)
             if records:
-                self.format_fn(records)
+                self.format_records(records, ctx)
                 self.write_records(records, ctx)
                 journal_number = max((record[self.bookmark_key] for record in records))
                 ctx.set_bookmark(bookmark, journal_number)
@@ -150,30 +451,69 @@ class Journals(Stream):
             if not records or len(records) < FULL_PAGE_SIZE:
                 break
 
+    def sync_windows(self, ctx, journal_number, partitions):
+        bookmark = [self.tap_stream_id, self.bookmark_key]
+
+        def fetch_window(window):
+            offset = journal_number + window * FULL_PAGE_SIZE
+            return _make_request(ctx, self.tap_stream_id, {"offset": offset})
+
+        # An incremental sync rarely finds more than one window of new
+        # journals, so the first window is fetched before any others are.
+        records = fetch_window(0)
+        with PagePrefetcher(fetch_window, 1, partitions) as windows:
+            window = 0
+            while True:
+                # Around a gap in the numbers a response runs into the next
+                # window, whose own request returns those journals again.
+                upper = journal_number + (window + 1) * FULL_PAGE_SIZE
+                in_window = [record for record in records or [] if record[self.bookmark_key] <= upper]
+                if in_window:
+                    self.format_records(in_window, ctx)
+                    self.write_records(in_window, ctx)
+                    ctx.set_bookmark(bookmark, max(record[self.bookmark_key] for record in in_window))
+                    ctx.write_state()
+                # A short window is the end of the journals. Later windows
+                # may hold journals posted after it was fetched, and writing
+                # those would leave a gap behind the bookmark.
+                if not records or len(records) < FULL_PAGE_SIZE:
+                    break
+                window += 1
+                records = windows.get(window)
+
 
 class LinkedTransactions(Stream):
     """The Linked Transactions endpoint is a special case. It supports
     pagination, but not the Modified At header, but the objects returned have
     the UpdatedDateUTC timestamp in them. Therefore we must always iterate over
     all of the data, but we can manually omit records based on the
-    UpdatedDateUTC property."""
+    UpdatedDateUTC property.
+
+    The endpoint takes no `where` or `order` parameter either, and the pages
+    are not ordered by UpdatedDateUTC, so every page is read and paging only
+    stops on a short page of raw records."""
     def sync(self, ctx):
         bookmark = [self.tap_stream_id, self.bookmark_key]
         offset = [self.tap_stream_id, "page"]
         start = ctx.update_start_date_bookmark(bookmark)
+        start_dt = strptime_with_tz(start)
         curr_page_num = ctx.get_offset(offset) or 1
-        max_updated = start
+        max_updated, max_updated_dt = start, start_dt
         while True:
             ctx.set_offset(offset, curr_page_num)
             ctx.write_state()
             filter_options = {"page": curr_page_num}
-            raw_records = _make_request(ctx, self.tap_stream_id, filter_options)
-            records = [x for x in raw_records
-                       if strptime_with_tz(x[self.bookmark_key]) >= strptime_with_tz(start)]
+            raw_records = _make_request(ctx, self.tap_stream_id, filter_options) or []
+            records = []
+            for record in raw_records:
+                updated_dt = strptime_with_tz(record[self.bookmark_key])
+                if updated_dt >= start_dt:
+                    records.append(record)
+                    if updated_dt > max_updated_dt:
+                        max_updated, max_updated_dt = record[self.bookmark_key], updated_dt
             if records:
                 self.write_records(records, ctx)
-                max_updated = records[-1][self.bookmark_key]
-            if not records or len(records) < FULL_PAGE_SIZE:
+            if len(raw_records) < FULL_PAGE_SIZE:
                 break
             curr_page_num += 1
         ctx.clear_offsets(self.tap_stream_id)
@@ -187,10 +527,68 @@ class Everything(Stream):
         self.bookmark_key = None
         self.replication_method = "FULL_TABLE"
 
+    @staticmethod
+    def emit_changed_only(ctx):
+        return ctx.config.get("emit_changed_records_only") in ["true", True]
+
+    @staticmethod
+    def emit_deletions(ctx):
+        return ctx.config.get("emit_deleted_records") in ["true", True]
+
+    def extra_properties(self, ctx):
+        if self.emit_changed_only(ctx) and self.emit_deletions(ctx):
+            return {DELETED_AT_KEY: {"type": ["null", "string"], "format": "date-time"}}
+        return {}
+
+    def record_key(self, record):
+        return RECORD_KEY_SEPARATOR.join(str(record[field]) for field in self.pk_fields)
+
+    @staticmethod
+    def record_hash(record):
+        serialized = json.dumps(record, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.blake2b(serialized.encode("utf-8"), digest_size=8).hexdigest()
+
     def sync(self, ctx):
-        records = _make_request(ctx, self.tap_stream_id)
-        self.format_fn(records)
-        self.write_records(records, ctx)
+        records = _make_request(ctx, self.tap_stream_id,
+                                stream_response=self.stream_responses(ctx))
+        if self.emit_changed_only(ctx):
+            self.sync_changed(records, ctx)
+        else:
+            self.write_batches(records, ctx)
+
+    def sync_changed(self, records, ctx):
+        """Emits only the records whose content differs from the previous
+        sync. A hash of every emitted record is kept in the bookmark, keyed
+        by primary key, and keys missing from this sync are optionally
+        emitted as deleted."""
+        hashes_path = [self.tap_stream_id, "record_hashes"]
+        previous = ctx.get_bookmark(hashes_path)
+        current = {}
+        for batch in _batches(records, RECORD_BATCH_SIZE):
+            self.format_records(batch, ctx)
+            changed = []
+            for record in self.transform_records(batch, ctx):
+                key = self.record_key(record)
+                current[key] = self.record_hash(record)
+                if previous is None or previous.get(key) != current[key]:
+                    changed.append(record)
+            if changed:
+                self.emit_records(changed, ctx)
+
+        if previous and self.emit_deletions(ctx):
+            deleted_at = utils.strftime(utils.now())
+            deleted = []
+            for key in previous.keys() - current.keys():
+                record = dict(zip(self.pk_fields, key.split(RECORD_KEY_SEPARATOR)))
+                record[DELETED_AT_KEY] = deleted_at
+                if ctx.tenant_id:
+                    record[TENANT_ID_KEY] = ctx.tenant_id
+                deleted.append(record)
+            if deleted:
+                self.emit_records(deleted, ctx)
+
+        ctx.set_bookmark(hashes_path, current)
+        ctx.write_state()
 
 
 all_streams = [
@@ -200,9 +598,11 @@ all_streams = [
     # parameters
     PaginatedStream("bank_transactions", ["BankTransactionID"]),
     Contacts(),
-    PaginatedStream("quotes", ["QuoteID"]),
+    # The Quotes endpoint documents neither pageSize nor a where filter
+    PaginatedStream("quotes", ["QuoteID"], supports_page_size=False, supports_where=False),
     PaginatedStream("credit_notes", ["CreditNoteID"], format_fn=transform.format_credit_notes),
-    PaginatedStream("invoices", ["InvoiceID"], format_fn=transform.format_invoices),
+    PaginatedStream("invoices", ["InvoiceID"], format_fn=transform.format_invoices,
+                    summary_omits=INVOICE_SUMMARY_OMITS),
     PaginatedStream("manual_journals", ["ManualJournalID"]),
     PaginatedStream("overpayments", ["OverpaymentID"], format_fn=transform.format_over_pre_payments),
     PaginatedStream("payments", ["PaymentID"], format_fn=transform.format_payments),
@@ -0,0 +1,81 @@
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import time
+try:
+    import fcntl
+except ImportError: # pragma: no cover
+    fcntl = None
+
+# Cached tokens are not used once they are this close to expiring
+EXPIRY_MARGIN = 5 * 60
+DEFAULT_EXPIRES_IN = 30 * 60
+
+
+class TokenCache():
+    """Keeps access tokens in a JSON file, so that runs which start within a
+    token's lifetime can skip the refresh.
+
+    Entries are keyed by a hash of the client id and tenant ids, so one
+    file can hold tokens for many connections, and store only the access
+    token and when it expires. Readers and writers in different processes
+    are serialized with a lock on `<path>.lock`, and the file itself is
+    replaced atomically."""
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+
+    @staticmethod
+    def key(config, tenant_ids):
+        value = "\n".join([config["client_id"]] + sorted(tenant_ids))
+        return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Holds the cache's lock, so that only one process refreshes a
+        token at a time."""
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            with open(self.path) as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key):
+        entry = self._read().get(key)
+        if entry and entry["expires_at"] - self.clock() > EXPIRY_MARGIN:
+            return entry["access_token"]
+        return None
+
+    def put(self, key, access_token, expires_in=None):
+        now = self.clock()
+        entries = {k: v for k, v in self._read().items() if v["expires_at"] > now}
+        entries[key] = {"access_token": access_token,
+                        "expires_at": now + (expires_in or DEFAULT_EXPIRES_IN)}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        # mkstemp creates the file readable by its owner only
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".token-cache-")
+        try:
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(entries, tmp_file)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def build_token_cache(config):
+    path = config.get("token_cache_path")
+    return TokenCache(path) if path else None
@@ -1,75 +1,104 @@
-def _format_nested_invoice(invoice):
-    invoice.pop("Prepayments", None)
-    invoice.pop("Payments", None)
-    invoice.pop("CreditNotes", None)
-    invoice.pop("Overpayments", None)
-
-
-def _format_allocations(allocations):
-    for allocation in allocations:
-        invoice = allocation.get("Invoice", {})
-        _format_nested_invoice(invoice)
-
-
-def format_credit_notes(credit_notes):
-    for credit_note in credit_notes:
-        credit_note.pop("Payments", None)
-        _format_allocations(credit_note.get("Allocations", []))
-
-
-def format_contact_groups(contact_groups):
-    for contact_group in contact_groups:
-        contact_group.pop("Contacts", None)
-
-
-def format_payments(payments):
-    for payment in payments:
-        invoice = payment.get("Invoice", {})
-        _format_nested_invoice(invoice)
-
-
-def format_over_pre_payments(over_pre_payments):
-    for payment in over_pre_payments:
-        _format_allocations(payment.get("Allocations", []))
+# NB: Xero sometimes formats a date as '/Date(0+0000)/' to indicate it is 0
+# milliseconds from the unix epoch. Convert this to a datetime that will be
+# accepted by the transformer. This should not cause inconsitencies because
+# the date is normally returned as an iso8601 string and this edge case
+# causes it to be returned differently
+EPOCH_SENTINEL = '/Date(0+0000)/'
+EPOCH = '1970-01-01T00:00:00.000000Z'
+
+# Invoices nested in other records carry their own payments, which are
+# synced by their own streams
+NESTED_INVOICE_KEYS = ("Prepayments", "Payments", "CreditNotes", "Overpayments")
+
+
+def _paths(prefix, keys):
+    return ["{}.{}".format(prefix, key) for key in keys]
+
+
+class _Node():
+    def __init__(self):
+        self.drop = []
+        self.epoch_dates = []
+        # key -> (applies to each item of a list, _Node)
+        self.children = {}
+
+    def child(self, segment):
+        is_list = segment.endswith("[]")
+        key = segment[:-2] if is_list else segment
+        if key not in self.children:
+            self.children[key] = (is_list, _Node())
+        elif self.children[key][0] != is_list:
+            raise ValueError("{} is used both as a list and as an object".format(key))
+        return self.children[key][1]
+
+
+def _build_tree(drop, epoch_dates):
+    root = _Node()
+    for paths, attr in ((drop, "drop"), (epoch_dates, "epoch_dates")):
+        for path in paths:
+            node = root
+            *parents, key = path.split(".")
+            for segment in parents:
+                node = node.child(segment)
+            getattr(node, attr).append(key)
+    return root
+
+
+def _prune(node, value):
+    for key in node.drop:
+        value.pop(key, None)
+    for key in node.epoch_dates:
+        if value.get(key) == EPOCH_SENTINEL:
+            value[key] = EPOCH
+    for key, (is_list, child) in node.children.items():
+        nested = value.get(key)
+        if is_list:
+            if isinstance(nested, list):
+                for item in nested:
+                    if isinstance(item, dict):
+                        _prune(child, item)
+        elif isinstance(nested, dict):
+            _prune(child, nested)
+
+
+class RecordPruner():
+    """Formats a page of records in place from a declarative spec. `drop`
+    lists the paths removed from every record, and `epoch_dates` the paths
+    whose EPOCH_SENTINEL is rewritten to EPOCH. A path is a dotted list of
+    keys, where a key ending in `[]` applies the rest of the path to each
+    item of that list, e.g. "Allocations[].Invoice.Payments".
+
+    The paths are merged into a tree of nodes, so each nested object of a
+    record is visited once however many paths run through it. Missing keys
+    and null values are skipped. The compiled transform applies `tree`
+    while copying each record."""
+    def __init__(self, drop=(), epoch_dates=()):
+        self.drop = tuple(drop)
+        self.epoch_dates = tuple(epoch_dates)
+        self.tree = _build_tree(self.drop, self.epoch_dates)
+
+    def __call__(self, records):
+        for record in records:
+            _prune(self.tree, record)
+
+
+format_credit_notes = RecordPruner(
+    drop=["Payments"] + _paths("Allocations[].Invoice", NESTED_INVOICE_KEYS))
+
+format_contact_groups = RecordPruner(drop=["Contacts"])
+
+format_payments = RecordPruner(drop=_paths("Invoice", NESTED_INVOICE_KEYS))
+
+format_over_pre_payments = RecordPruner(drop=_paths("Allocations[].Invoice", NESTED_INVOICE_KEYS))
+
+strip_warnings = RecordPruner(drop=["Warnings"])
 
+format_users = strip_warnings
 
-def strip_warnings(records):
-    for record in records:
-        record.pop("Warnings", None)
+format_receipts = RecordPruner(drop=["Warnings", "User.Warnings", "Contact.Warnings"])
 
-format_users = strip_warnings
+format_contacts = RecordPruner(drop=["Warnings", "ContactGroups[].Contacts"])
 
+format_invoices = RecordPruner(epoch_dates=["Date"])
 
-def format_receipts(receipts):
-    strip_warnings(receipts)
-    for receipt in receipts:
-        receipt.get("User", {}).pop("Warnings", None)
-        receipt.get("Contact", {}).pop("Warnings", None)
-
-
-def format_contacts(contacts):
-    strip_warnings(contacts)
-    for contact in contacts:
-        format_contact_groups(contact["ContactGroups"])
-
-def format_invoices(invoices):
-    # NB: Xero sometimes formats the Date as '/Date(0+0000)/' to indicate
-    # it is 0 milliseconds from the unix epoch. Convert this to a datetime
-    # that will be accepted by the transformer. This should not cause
-    # inconsitencies because the 'Date' is normally returned as an iso8601
-    # string and this edge case causes it to be returned differently
-    for invoice in invoices:
-        if invoice.get('Date') == '/Date(0+0000)/':
-            invoice['Date'] = '1970-01-01T00:00:00.000000Z'
-
-
-def format_journals(journals):
-    # NB: Xero sometimes formats the JournalDate as '/Date(0+0000)/' to
-    # indicate it is 0 milliseconds from the unix epoch. Convert this to a
-    # datetime that will be accepted by the transformer. This should not
-    # cause inconsitencies because the 'Date' is normally returned as an
-    # iso8601 string and this edge case causes it to be returned
-    # differently
-    for journal in journals:
-        if journal.get('JournalDate') == '/Date(0+0000)/':
-            journal['JournalDate'] = '1970-01-01T00:00:00.000000Z'
+format_journals = RecordPruner(epoch_dates=["JournalDate"])
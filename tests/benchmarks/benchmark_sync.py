@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Runs `tap_xero.sync` end to end against the local mock Xero server and
+reports throughput, CPU time per record, peak RSS and request counts.
+
+    python tests/benchmarks/benchmark_sync.py --records 5000 --latency 0.05 \\
+        --streams invoices,contacts,journals --config '{"max_stream_workers": 4}'
+
+Xero's rate limits are lifted for the run, as the point is to measure the
+tap rather than the API budget."""
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from unittest import mock
+
+from singer import metadata
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+import tap_xero  # pylint: disable=wrong-import-position
+import tap_xero.client as client_  # pylint: disable=wrong-import-position
+from tap_xero.context import Context  # pylint: disable=wrong-import-position
+from mock_xero_server import MockXeroServer  # pylint: disable=wrong-import-position
+
+
+class RecordCountingSink():
+    """Stands in for stdout and counts RECORD messages per stream without
+    decoding them."""
+    RECORD_PREFIX = '{"type": "RECORD", "stream": "'
+
+    def __init__(self):
+        self.record_counts = {}
+        self.bytes_written = 0
+
+    def write(self, text):
+        self.bytes_written += len(text)
+        for line in text.splitlines():
+            if line.startswith(self.RECORD_PREFIX):
+                start = len(self.RECORD_PREFIX)
+                stream = line[start:line.index('"', start)]
+                self.record_counts[stream] = self.record_counts.get(stream, 0) + 1
+
+    def flush(self):
+        pass
+
+
+def select_streams(catalog, stream_ids):
+    for entry in catalog.streams:
+        if stream_ids and entry.tap_stream_id not in stream_ids:
+            continue
+        mdata = metadata.write(metadata.to_map(entry.metadata), (), "selected", True)
+        entry.metadata = metadata.to_list(mdata)
+    return catalog
+
+
+def run_benchmark(records_per_stream=1000, latency=0.0, stream_ids=None, config_overrides=None):
+    config = {
+        "start_date": "2015-01-01T00:00:00Z",
+        "client_id": "client",
+        "client_secret": "secret",
+        "tenant_id": "tenant",
+        "refresh_token": "refresh",
+    }
+    config.update(config_overrides or {})
+
+    with MockXeroServer(records_per_stream, latency) as server, \
+         tempfile.TemporaryDirectory() as tmp_dir, \
+         mock.patch.object(client_, "BASE_URL", server.base_url), \
+         mock.patch.object(client_, "TOKEN_URL", server.token_url), \
+         mock.patch.object(client_, "MINUTE_LIMIT", sys.maxsize), \
+         mock.patch.object(client_, "APP_MINUTE_LIMIT", sys.maxsize), \
+         mock.patch.object(client_, "DAY_LIMIT", sys.maxsize):
+        config_path = os.path.join(tmp_dir, "config.json")
+        with open(config_path, "w") as config_file:
+            json.dump(config, config_file)
+
+        catalog = tap_xero.discover(Context(config, {}, {}, config_path))
+        select_streams(catalog, stream_ids)
+        discovery_requests = server.request_counts()
+
+        sink = RecordCountingSink()
+        stdout = sys.stdout
+        sys.stdout = sink
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            tap_xero.sync(Context(config, {}, catalog, config_path))
+        finally:
+            sys.stdout = stdout
+        wall_seconds = time.perf_counter() - wall_start
+        cpu_seconds = time.process_time() - cpu_start
+
+        request_counts = server.request_counts()
+        for stream_id, count in discovery_requests.items():
+            request_counts[stream_id] -= count
+
+    total_records = sum(sink.record_counts.values())
+    return {
+        "records": total_records,
+        "wall_seconds": wall_seconds,
+        "cpu_seconds": cpu_seconds,
+        "records_per_second": total_records / wall_seconds if wall_seconds else 0,
+        "cpu_ms_per_record": 1000 * cpu_seconds / total_records if total_records else 0,
+        # ru_maxrss is reported in kilobytes on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "output_bytes": sink.bytes_written,
+        "streams": {stream_id: {"records": sink.record_counts.get(stream_id, 0),
+                                "requests": request_counts.get(stream_id, 0)}
+                    for stream_id in sorted(set(sink.record_counts) | set(request_counts))},
+    }
+
+
+def print_report(result):
+    print("{:<24}{:>10}{:>10}".format("stream", "records", "requests"))
+    for stream_id, counts in result["streams"].items():
+        print("{:<24}{:>10}{:>10}".format(stream_id, counts["records"], counts["requests"]))
+    print()
+    print("records:          {}".format(result["records"]))
+    print("wall time:        {:.2f}s".format(result["wall_seconds"]))
+    print("records/sec:      {:.0f}".format(result["records_per_second"]))
+    print("cpu ms/record:    {:.3f}".format(result["cpu_ms_per_record"]))
+    print("peak rss:         {:.1f} MB".format(result["peak_rss_mb"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--records", type=int, default=1000,
+                        help="records served per stream")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds the server waits before each response")
+    parser.add_argument("--streams", default="",
+                        help="comma separated streams to select, default all")
+    parser.add_argument("--config", default="{}",
+                        help="JSON object merged into the tap config")
+    parser.add_argument("--json", action="store_true",
+                        help="print the result as JSON")
+    args = parser.parse_args()
+
+    result = run_benchmark(records_per_stream=args.records,
+                           latency=args.latency,
+                           stream_ids=[s for s in args.streams.split(",") if s],
+                           config_overrides=json.loads(args.config))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Compares the `RecordPruner` formatters in `tap_xero.transform` with the
+hand written loops they replaced, on records built from each stream's
+schema with every pruned path present.
+
+    python tests/benchmarks/benchmark_transform.py --records 5000 --repeat 5
+
+Two things are timed per stream: the formatter on its own, and the whole
+format and transform step, where the old formatter runs before the
+`RecordTransformer` and the pruner is fused into it. Both versions are
+checked to produce the same records before they are timed."""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+import tap_xero  # pylint: disable=wrong-import-position
+from tap_xero import streams as streams_  # pylint: disable=wrong-import-position
+from tap_xero import transform  # pylint: disable=wrong-import-position
+from tap_xero.client import _json_load_object_hook  # pylint: disable=wrong-import-position
+from tap_xero.compiled_transform import RecordTransformer  # pylint: disable=wrong-import-position
+from mock_xero_server import RecordFactory  # pylint: disable=wrong-import-position
+
+
+def _legacy_format_nested_invoice(invoice):
+    invoice.pop("Prepayments", None)
+    invoice.pop("Payments", None)
+    invoice.pop("CreditNotes", None)
+    invoice.pop("Overpayments", None)
+
+
+def _legacy_format_allocations(allocations):
+    for allocation in allocations:
+        invoice = allocation.get("Invoice", {})
+        _legacy_format_nested_invoice(invoice)
+
+
+def legacy_format_credit_notes(credit_notes):
+    for credit_note in credit_notes:
+        credit_note.pop("Payments", None)
+        _legacy_format_allocations(credit_note.get("Allocations", []))
+
+
+def legacy_format_contact_groups(contact_groups):
+    for contact_group in contact_groups:
+        contact_group.pop("Contacts", None)
+
+
+def legacy_format_payments(payments):
+    for payment in payments:
+        invoice = payment.get("Invoice", {})
+        _legacy_format_nested_invoice(invoice)
+
+
+def legacy_format_over_pre_payments(over_pre_payments):
+    for payment in over_pre_payments:
+        _legacy_format_allocations(payment.get("Allocations", []))
+
+
+def legacy_strip_warnings(records):
+    for record in records:
+        record.pop("Warnings", None)
+
+
+def legacy_format_receipts(receipts):
+    legacy_strip_warnings(receipts)
+    for receipt in receipts:
+        receipt.get("User", {}).pop("Warnings", None)
+        receipt.get("Contact", {}).pop("Warnings", None)
+
+
+def legacy_format_contacts(contacts):
+    legacy_strip_warnings(contacts)
+    for contact in contacts:
+        legacy_format_contact_groups(contact["ContactGroups"])
+
+
+def legacy_format_invoices(invoices):
+    for invoice in invoices:
+        if invoice.get('Date') == '/Date(0+0000)/':
+            invoice['Date'] = '1970-01-01T00:00:00.000000Z'
+
+
+def legacy_format_journals(journals):
+    for journal in journals:
+        if journal.get('JournalDate') == '/Date(0+0000)/':
+            journal['JournalDate'] = '1970-01-01T00:00:00.000000Z'
+
+
+# tap_stream_id -> (formatter before RecordPruner, RecordPruner)
+FORMATTERS = {
+    "contacts": (legacy_format_contacts, transform.format_contacts),
+    "contact_groups": (legacy_format_contact_groups, transform.format_contact_groups),
+    "credit_notes": (legacy_format_credit_notes, transform.format_credit_notes),
+    "invoices": (legacy_format_invoices, transform.format_invoices),
+    "journals": (legacy_format_journals, transform.format_journals),
+    "overpayments": (legacy_format_over_pre_payments, transform.format_over_pre_payments),
+    "payments": (legacy_format_payments, transform.format_payments),
+    "prepayments": (legacy_format_over_pre_payments, transform.format_over_pre_payments),
+    "receipts": (legacy_format_receipts, transform.format_receipts),
+    "users": (legacy_strip_warnings, transform.format_users),
+}
+
+
+def _fill_path(value, segments, leaf):
+    if not segments:
+        return
+    segment, rest = segments[0], segments[1:]
+    is_list = segment.endswith("[]")
+    key = segment[:-2] if is_list else segment
+    if not rest:
+        value[key] = leaf
+    elif is_list:
+        items = value.get(key) or [{}, {}]
+        value[key] = items
+        for item in items:
+            _fill_path(item, rest, leaf)
+    else:
+        value[key] = value.get(key) or {}
+        _fill_path(value[key], rest, leaf)
+
+
+def build_records(tap_stream_id, count):
+    """Builds `count` records for the stream, encoded as JSON, in which
+    every path its pruner touches is present."""
+    stream = next(s for s in streams_.all_streams if s.tap_stream_id == tap_stream_id)
+    template = RecordFactory(stream).build(1)
+    pruner = FORMATTERS[tap_stream_id][1]
+    for path in pruner.drop:
+        _fill_path(template, path.split("."), [{"Message": "Lorem ipsum"}])
+    for path in pruner.epoch_dates:
+        _fill_path(template, path.split("."), transform.EPOCH_SENTINEL)
+    # Decoded again for every run, which is much faster than deepcopy
+    return json.dumps([template] * count)
+
+
+def _decode(encoded_records):
+    # As the client does, so that the compiled transform accepts the dates
+    return json.loads(encoded_records, object_hook=_json_load_object_hook)
+
+
+def _format_and_transform(format_fn, transformer):
+    def run(records):
+        format_fn(records)
+        return [transformer.transform(record) for record in records]
+    return run
+
+
+def _time_once(format_fn, encoded_records):
+    batch = _decode(encoded_records)
+    # As timeit does, so that collecting the freshly decoded records is
+    # not charged to whichever formatter happens to trigger it
+    gc.disable()
+    start = time.perf_counter()
+    format_fn(batch)
+    elapsed = time.perf_counter() - start
+    gc.enable()
+    return elapsed
+
+
+def time_pair(legacy_fn, new_fn, encoded_records, repeat):
+    """Returns the fastest run of each function. The runs alternate, so
+    that both see the same drift in machine load."""
+    legacy_times, new_times = [], []
+    for _ in range(repeat):
+        legacy_times.append(_time_once(legacy_fn, encoded_records))
+        new_times.append(_time_once(new_fn, encoded_records))
+    return min(legacy_times), min(new_times)
+
+
+def run_benchmark(records_per_stream=2000, repeat=3, stream_ids=None):
+    result = {}
+    for tap_stream_id, (legacy_fn, pruner) in sorted(FORMATTERS.items()):
+        if stream_ids and tap_stream_id not in stream_ids:
+            continue
+        records = build_records(tap_stream_id, records_per_stream)
+        legacy_records, pruned_records = _decode(records), _decode(records)
+        legacy_fn(legacy_records)
+        pruner(pruned_records)
+        if legacy_records != pruned_records:
+            raise AssertionError("{} records differ between formatters".format(tap_stream_id))
+
+        stream = next(s for s in streams_.all_streams if s.tap_stream_id == tap_stream_id)
+        schema = tap_xero.load_schema(tap_stream_id)
+        mdata = tap_xero.load_metadata(stream, schema)
+        legacy_step = _format_and_transform(legacy_fn, RecordTransformer(schema, mdata))
+        fused_step = _format_and_transform(streams_._no_format, RecordTransformer(schema, mdata, pruner))
+        if legacy_step(_decode(records)) != fused_step(_decode(records)):
+            raise AssertionError("{} records differ between transforms".format(tap_stream_id))
+
+        legacy_seconds, pruner_seconds = time_pair(legacy_fn, pruner, records, repeat)
+        legacy_transform_seconds, fused_transform_seconds = time_pair(legacy_step, fused_step, records, repeat)
+        result[tap_stream_id] = {
+            "legacy_seconds": legacy_seconds,
+            "pruner_seconds": pruner_seconds,
+            "legacy_transform_seconds": legacy_transform_seconds,
+            "fused_transform_seconds": fused_transform_seconds,
+        }
+    return result
+
+
+def print_report(result):
+    print("{:<16} {:>10} {:>10} {:>8}   {:>12} {:>12} {:>8}".format(
+        "stream", "legacy ms", "pruner ms", "speedup", "+transform", "fused ms", "speedup"))
+    for tap_stream_id, times in result.items():
+        print("{:<16} {:>10.2f} {:>10.2f} {:>7.2f}x   {:>12.2f} {:>12.2f} {:>7.2f}x".format(
+            tap_stream_id, times["legacy_seconds"] * 1000, times["pruner_seconds"] * 1000,
+            times["legacy_seconds"] / times["pruner_seconds"],
+            times["legacy_transform_seconds"] * 1000, times["fused_transform_seconds"] * 1000,
+            times["legacy_transform_seconds"] / times["fused_transform_seconds"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--records", type=int, default=2000,
+                        help="records formatted per stream")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per formatter, the fastest is reported")
+    parser.add_argument("--streams", default="",
+                        help="comma separated streams to compare, default all")
+    parser.add_argument("--json", action="store_true",
+                        help="print the result as JSON")
+    args = parser.parse_args()
+
+    result = run_benchmark(records_per_stream=args.records,
+                           repeat=args.repeat,
+                           stream_ids=[s for s in args.streams.split(",") if s])
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+
+if __name__ == "__main__":
+    main()
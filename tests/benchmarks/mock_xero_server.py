@@ -0,0 +1,218 @@
+"""A local HTTP server which imitates the parts of the Xero API the tap uses.
+
+Every endpoint serves `records_per_stream` synthetic records built from the
+tap's own schemas, with .NET `/Date(...)/` strings, nested Contacts,
+LineItems and Allocations. Paginated endpoints honour `page` and
+`pageSize`, and the date range `where` filters of backfill shards. Journals
+honours `offset`, and all other endpoints return everything at once.
+Responses are gzipped when the client asks for it.
+
+The server runs in its own process so that it does not count towards the
+CPU time or memory of the tap being measured."""
+import calendar
+import copy
+import datetime
+import gzip
+import json
+import multiprocessing
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+import tap_xero
+from tap_xero import streams as streams_
+
+API_PATH = "/api.xro/2.0/"
+TOKEN_PATH = "/connect/token"
+STATS_PATH = "/__stats"
+BASE_MILLIS = 1577836800000
+MAX_DEPTH = 3
+WHERE_CLAUSE = re.compile(r"(\w+)(>=|<)DateTime\((\d+),(\d+),(\d+),(\d+),(\d+),(\d+)\)")
+
+
+def _sample_value(key, schema, depth):
+    types = schema.get("type", [])
+    if not isinstance(types, list):
+        types = [types]
+    if schema.get("format") == "date-time":
+        if key.endswith("UTC"):
+            return "/Date({}+0000)/".format(BASE_MILLIS)
+        return "2020-01-01T00:00:00"
+    if "object" in types:
+        if depth >= MAX_DEPTH:
+            return {}
+        return {sub_key: _sample_value(sub_key, sub_schema, depth + 1)
+                for sub_key, sub_schema in schema.get("properties", {}).items()}
+    if "array" in types:
+        if depth >= MAX_DEPTH:
+            return []
+        return [_sample_value(key, schema["items"], depth + 1) for _ in range(2)]
+    if "number" in types:
+        return 1234.5
+    if "integer" in types:
+        return 7
+    if "boolean" in types:
+        return True
+    return "Lorem ipsum dolor sit amet"
+
+
+def _where_numbers(where, stream, total):
+    """Returns the numbers of the records matching a `where` filter of date
+    bounds on the stream's bookmark, as backfill shards send it. Record n
+    is updated at BASE_MILLIS + n seconds. Raises ValueError for any other
+    filter."""
+    first, last = 1, total
+    for clause in where.split("&&"):
+        match = WHERE_CLAUSE.fullmatch(clause.strip())
+        if not match or match.group(1) != stream.bookmark_key:
+            raise ValueError("Unsupported where filter: {}".format(where))
+        bound = datetime.datetime(*[int(part) for part in match.groups()[2:]])
+        seconds = calendar.timegm(bound.timetuple()) - BASE_MILLIS // 1000
+        if match.group(2) == ">=":
+            first = max(first, seconds)
+        else:
+            last = min(last, seconds - 1)
+    return range(first, last + 1)
+
+
+class RecordFactory():
+    """Builds numbered records for a stream from a template generated from
+    its schema."""
+    def __init__(self, stream):
+        self.stream = stream
+        self.template = _sample_value(None, tap_xero.load_schema(stream.tap_stream_id), 0)
+
+    def build(self, number):
+        record = copy.deepcopy(self.template)
+        for pk_field in self.stream.pk_fields:
+            record[pk_field] = "{}-{}".format(self.stream.tap_stream_id, number)
+        if self.stream.tap_stream_id == "journals":
+            record["JournalNumber"] = number
+        elif self.stream.bookmark_key:
+            record[self.stream.bookmark_key] = "/Date({}+0000)/".format(BASE_MILLIS + number * 1000)
+        return record
+
+
+class MockXeroHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        pass
+
+    def _send_json(self, body):
+        payload = json.dumps(body).encode("utf-8")
+        headers = {"Content-Type": "application/json; charset=utf-8"}
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            payload = gzip.compress(payload, compresslevel=1)
+            headers["Content-Encoding"] = "gzip"
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._send_json({"access_token": "access", "refresh_token": "refresh"})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == STATS_PATH:
+            with self.server.lock:
+                self._send_json(dict(self.server.request_counts))
+            return
+
+        resource_name = url.path[len(API_PATH):]
+        stream = self.server.streams_by_resource[resource_name]
+        with self.server.lock:
+            self.server.request_counts[stream.tap_stream_id] = \
+                self.server.request_counts.get(stream.tap_stream_id, 0) + 1
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        total = self.server.records_per_stream
+        numbers = range(1, total + 1)
+        if "where" in params:
+            try:
+                numbers = _where_numbers(params["where"], stream, total)
+            except ValueError as error:
+                self.send_error(400, str(error))
+                return
+        if "page" in params:
+            page_size = int(params.get("pageSize", streams_.FULL_PAGE_SIZE))
+            first = (int(params["page"]) - 1) * page_size
+            numbers = numbers[first:first + page_size]
+        elif "offset" in params:
+            first = int(params["offset"]) + 1
+            numbers = range(first, min(first + streams_.FULL_PAGE_SIZE, total + 1))
+
+        factory = self.server.factories[stream.tap_stream_id]
+        self._send_json({"Id": "benchmark", "Status": "OK",
+                         resource_name: [factory.build(number) for number in numbers]})
+
+
+def _serve(port_queue, records_per_stream, latency):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockXeroHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.request_counts = {}
+    server.records_per_stream = records_per_stream
+    server.latency = latency
+    server.streams_by_resource = {s.tap_stream_id.title().replace("_", ""): s
+                                  for s in streams_.all_streams}
+    server.factories = {s.tap_stream_id: RecordFactory(s) for s in streams_.all_streams}
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class MockXeroServer():
+    """Starts the mock server in a child process.
+
+    with MockXeroServer(records_per_stream=1000, latency=0.05) as server:
+        server.base_url, server.token_url, server.request_counts()
+    """
+    def __init__(self, records_per_stream=1000, latency=0.0):
+        self.records_per_stream = records_per_stream
+        self.latency = latency
+        self.process = None
+        self.port = None
+
+    @property
+    def root_url(self):
+        return "http://127.0.0.1:{}".format(self.port)
+
+    @property
+    def base_url(self):
+        return self.root_url + API_PATH.rstrip("/")
+
+    @property
+    def token_url(self):
+        return self.root_url + TOKEN_PATH
+
+    def request_counts(self):
+        return requests.get(self.root_url + STATS_PATH).json()
+
+    def start(self):
+        port_queue = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=_serve, args=(port_queue, self.records_per_stream, self.latency), daemon=True)
+        self.process.start()
+        self.port = port_queue.get(timeout=30)
+
+    def stop(self):
+        if self.process:
+            self.process.terminate()
+            self.process.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
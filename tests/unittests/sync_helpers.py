@@ -0,0 +1,92 @@
+"""Fixtures shared by the tests which run a sync against canned responses"""
+import json
+import threading
+from unittest import mock
+
+from singer.catalog import Catalog, CatalogEntry, Schema
+
+import tap_xero
+import tap_xero.streams as stream_
+from tap_xero.context import Context
+
+
+class MockCatalogStream:
+    def __init__(self, tap_stream_id, selected=True):
+        self.tap_stream_id = tap_stream_id
+        self.selected = selected
+
+    def is_selected(self):
+        return self.selected
+
+
+class MockCatalog:
+    """A catalog selecting the given streams, for syncs whose streams are
+    mocked and so never read the schema or metadata"""
+    def __init__(self, stream_ids):
+        self.streams = [MockCatalogStream(stream_id) for stream_id in stream_ids]
+
+
+def build_context(config=None, state=None, catalog=None):
+    """Returns a real Context whose writer is a Mock, so that the messages
+    a sync writes can be inspected instead of going to stdout."""
+    ctx = Context(config or {}, state if state is not None else {}, catalog, None)
+    ctx.writer = mock.Mock()
+    return ctx
+
+
+def run_stream_sync(stream, ctx, responses, calls=None):
+    """Syncs the stream with every request answered by
+    `responses(filter_options)`, which may raise. Returns the filter options
+    of the requests in the order they were made, from any thread. Pass
+    `calls` to keep them when the sync raises."""
+    calls = [] if calls is None else calls
+    lock = threading.Lock()
+
+    def fake_request(ctx, tap_stream_id, filter_options=None, **kwargs):
+        with lock:
+            calls.append(dict(filter_options or {}))
+        return responses(dict(filter_options or {}))
+
+    with mock.patch("tap_xero.streams._make_request", side_effect=fake_request):
+        stream.sync(ctx)
+    return calls
+
+
+def build_catalog(tap_stream_id):
+    """Returns a catalog of the stream with every field selected"""
+    stream = [s for s in stream_.all_streams if s.tap_stream_id == tap_stream_id][0]
+    schema = tap_xero.load_schema(tap_stream_id)
+    return Catalog([CatalogEntry(tap_stream_id=tap_stream_id, stream=tap_stream_id,
+                                 key_properties=stream.pk_fields, schema=Schema.from_dict(schema),
+                                 metadata=tap_xero.load_metadata(stream, schema))])
+
+
+def build_pages(page_sizes):
+    """Returns pages of invoices keyed by page number. The invoices on page
+    n are updated on the nth of April."""
+    return {page_num: [{"InvoiceID": "{}-{}".format(page_num, i),
+                        "UpdatedDateUTC": "2021-04-{:02d}T00:00:00Z".format(page_num)}
+                       for i in range(size)]
+            for page_num, size in enumerate(page_sizes, start=1)}
+
+
+def page_responses(pages, fail_on_page=None):
+    """Returns `responses` for `run_stream_sync` which answers each request
+    with the page it asks for, and raises RuntimeError for `fail_on_page`."""
+    def responses(filter_options):
+        if filter_options["page"] == fail_on_page:
+            raise RuntimeError("boom")
+        return pages.get(filter_options["page"], [])
+    return responses
+
+
+def written_records(ctx):
+    """Returns the records the sync wrote, in order, whether they were
+    written as records or, by the page pipeline, as encoded lines"""
+    records = []
+    for name, args, _ in ctx.writer.mock_calls:
+        if name == "write_records":
+            records.extend(args[1])
+        elif name == "write_lines":
+            records.extend(json.loads(line)["record"] for line in args[0])
+    return records
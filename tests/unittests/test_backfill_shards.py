@@ -0,0 +1,108 @@
+import datetime
+import threading
+import unittest
+from unittest import mock
+
+import pytz
+
+import tap_xero.streams as stream_
+
+from sync_helpers import build_context, run_stream_sync
+
+NOW = datetime.datetime(2021, 1, 1, tzinfo=pytz.UTC)
+
+
+def shard_config(shards=4):
+    return {"start_date": "2020-12-28T00:00:00Z", "backfill_shards": shards}
+
+
+@mock.patch("tap_xero.streams.utils.now", return_value=NOW)
+@mock.patch.object(stream_.PaginatedStream, "write_records")
+class TestBackfillShards(unittest.TestCase):
+    """
+    Test cases to verify that an initial sync can be split into date range shards
+    """
+
+    def run_sync(self, ctx, responses):
+        return run_stream_sync(stream_.PaginatedStream("invoices", ["InvoiceID"]), ctx, responses)
+
+    def test_initial_sync_is_sharded(self, mocked_write, mocked_now):
+        ctx = build_context(shard_config())
+
+        def responses(options):
+            if options["page"] == 1:
+                # One record per shard, dated by the shard's position
+                day = 28 + calls_where.index(options["where"])
+                return [{"UpdatedDateUTC": "2020-12-{}T12:00:00.000000Z".format(day)}]
+            return []
+
+        calls_where = []
+        real_get = stream_.PaginatedStream.get_backfill_shards
+
+        def capture_shards(stream, ctx, bookmark):
+            shards = real_get(stream, ctx, bookmark)
+            calls_where.extend(shard["where"] for shard in shards)
+            return shards
+
+        with mock.patch.object(stream_.PaginatedStream, "get_backfill_shards", capture_shards):
+            calls = self.run_sync(ctx, responses)
+
+        self.assertEqual(calls_where, [
+            "UpdatedDateUTC>=DateTime(2020,12,28,00,00,00)&&UpdatedDateUTC<DateTime(2020,12,29,00,00,00)",
+            "UpdatedDateUTC>=DateTime(2020,12,29,00,00,00)&&UpdatedDateUTC<DateTime(2020,12,30,00,00,00)",
+            "UpdatedDateUTC>=DateTime(2020,12,30,00,00,00)&&UpdatedDateUTC<DateTime(2020,12,31,00,00,00)",
+            "UpdatedDateUTC>=DateTime(2020,12,31,00,00,00)",
+        ])
+        self.assertEqual(len(calls), 4)
+        self.assertTrue(all(c["order"] == "UpdatedDateUTC ASC" for c in calls))
+        # The bookmark is the largest value seen across every shard
+        self.assertEqual(ctx.get_bookmark(["invoices", "UpdatedDateUTC"]), "2020-12-31T12:00:00.000000Z")
+        self.assertEqual(ctx.get_offset(["invoices", "shards"]), None)
+
+    def test_interrupted_backfill_resumes_each_shard(self, mocked_write, mocked_now):
+        shards = [
+            {"where": "a", "page": 3, "max_updated": "2018-01-01T00:00:00Z", "done": True},
+            {"where": "b", "page": 2, "max_updated": "2019-01-01T00:00:00Z", "done": False},
+        ]
+        state = {"bookmarks": {"invoices": {"UpdatedDateUTC": "2017-01-01T00:00:00Z",
+                                            "offset": {"shards": shards}}}}
+        ctx = build_context(shard_config(), state)
+
+        calls = self.run_sync(ctx, lambda options: [])
+
+        self.assertEqual([(c["where"], c["page"]) for c in calls], [("b", 2)])
+        self.assertEqual(ctx.get_bookmark(["invoices", "UpdatedDateUTC"]), "2019-01-01T00:00:00Z")
+
+    def test_incremental_sync_is_not_sharded(self, mocked_write, mocked_now):
+        state = {"bookmarks": {"invoices": {"UpdatedDateUTC": "2020-01-01T00:00:00Z"}}}
+        ctx = build_context(shard_config(), state)
+
+        calls = self.run_sync(ctx, lambda options: [])
+
+        self.assertEqual(len(calls), 1)
+        self.assertNotIn("where", calls[0])
+
+    def test_stream_without_where_is_not_sharded(self, mocked_write, mocked_now):
+        ctx = build_context(shard_config())
+        stream = next(s for s in stream_.all_streams if s.tap_stream_id == "quotes")
+
+        self.assertIsNone(stream.get_backfill_shards(ctx, ["quotes", "UpdatedDateUTC"]))
+
+    def test_failing_shard_stops_the_others(self, mocked_write, mocked_now):
+        ctx = build_context(shard_config(2))
+        failed = threading.Event()
+
+        def responses(options):
+            if "DateTime(2020,12,30" in options["where"].split("&&")[0]:
+                failed.set()
+                raise RuntimeError("boom")
+            # The other shard would page forever if it were not stopped
+            failed.wait(5)
+            return [{"UpdatedDateUTC": "2020-12-28T12:00:00.000000Z"}] * 100
+
+        with self.assertRaises(RuntimeError):
+            self.run_sync(ctx, responses)
+
+        shards = ctx.get_offset(["invoices", "shards"])
+        self.assertFalse(shards[0]["done"])
+        self.assertLessEqual(shards[0]["page"], 3)
@@ -0,0 +1,23 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+from benchmark_sync import run_benchmark  # pylint: disable=wrong-import-position
+
+
+class TestBenchmarkHarness(unittest.TestCase):
+    """
+    Test case to verify that the benchmark harness can sync against the mock Xero server
+    """
+
+    def test_small_sync_against_mock_server(self):
+        result = run_benchmark(records_per_stream=150,
+                               stream_ids=["invoices", "journals", "currencies"])
+
+        self.assertEqual(result["streams"]["invoices"], {"records": 150, "requests": 2})
+        self.assertEqual(result["streams"]["journals"], {"records": 150, "requests": 2})
+        self.assertEqual(result["streams"]["currencies"], {"records": 150, "requests": 1})
+        self.assertEqual(result["records"], 450)
+        self.assertGreater(result["records_per_second"], 0)
@@ -0,0 +1,84 @@
+import datetime
+import unittest
+from unittest import mock
+
+import pytz
+
+import tap_xero
+import tap_xero.streams as streams_
+
+from sync_helpers import build_context as build_sync_context, run_stream_sync
+
+NOW = datetime.datetime(2021, 1, 1, tzinfo=pytz.UTC)
+
+
+def build_context(config):
+    ctx = build_sync_context(config)
+    ctx.get_record_transformer = mock.Mock(return_value=mock.Mock(transform=dict))
+    return ctx
+
+
+def currencies(*codes_and_descriptions):
+    return [{"Code": code, "Description": description} for code, description in codes_and_descriptions]
+
+
+@mock.patch("tap_xero.streams.utils.now", return_value=NOW)
+class TestChangedRecords(unittest.TestCase):
+    """
+    Test cases to verify that FULL_TABLE streams only emit records whose content changed
+    """
+
+    def run_sync(self, ctx, records):
+        run_stream_sync(streams_.Everything("currencies", ["Code"]), ctx, lambda options: records)
+        return [record for call in ctx.writer.write_records.call_args_list for record in call[0][1]]
+
+    def test_everything_is_emitted_by_default(self, mocked_now):
+        ctx = build_context({})
+
+        self.run_sync(ctx, currencies(("NZD", "New Zealand Dollar")))
+        emitted = self.run_sync(ctx, currencies(("NZD", "New Zealand Dollar")))
+
+        self.assertEqual(len(emitted), 2)
+        self.assertNotIn("bookmarks", ctx.state)
+
+    def test_only_changed_records_are_emitted(self, mocked_now):
+        ctx = build_context({"emit_changed_records_only": "true"})
+
+        first = self.run_sync(ctx, currencies(("NZD", "New Zealand Dollar"), ("USD", "US Dollar")))
+        ctx.writer.reset_mock()
+        second = self.run_sync(ctx, currencies(("NZD", "New Zealand Dollar"), ("USD", "United States Dollar"),
+                                               ("EUR", "Euro")))
+
+        self.assertEqual([r["Code"] for r in first], ["NZD", "USD"])
+        self.assertEqual([r["Code"] for r in second], ["USD", "EUR"])
+        self.assertEqual(sorted(ctx.get_bookmark(["currencies", "record_hashes"])), ["EUR", "NZD", "USD"])
+
+    def test_vanished_records_are_emitted_as_deleted(self, mocked_now):
+        ctx = build_context({"emit_changed_records_only": True, "emit_deleted_records": True})
+
+        self.run_sync(ctx, currencies(("NZD", "New Zealand Dollar"), ("USD", "US Dollar")))
+        ctx.writer.reset_mock()
+        emitted = self.run_sync(ctx, currencies(("NZD", "New Zealand Dollar")))
+
+        self.assertEqual(emitted, [{"Code": "USD", "_sdc_deleted_at": "2021-01-01T00:00:00.000000Z"}])
+        self.assertEqual(list(ctx.get_bookmark(["currencies", "record_hashes"])), ["NZD"])
+
+    def test_deletions_are_not_emitted_unless_enabled(self, mocked_now):
+        ctx = build_context({"emit_changed_records_only": True})
+
+        self.run_sync(ctx, currencies(("NZD", "New Zealand Dollar")))
+        ctx.writer.reset_mock()
+        emitted = self.run_sync(ctx, [])
+
+        self.assertEqual(emitted, [])
+
+    def test_schema_declares_deleted_at(self, mocked_now):
+        ctx = build_context({"emit_changed_records_only": True, "emit_deleted_records": True})
+
+        tap_xero.load_and_write_schema(ctx, streams_.Everything("currencies", ["Code"]))
+        tap_xero.load_and_write_schema(ctx, streams_.BookmarkedStream("accounts", ["AccountID"]))
+
+        currencies_schema = ctx.writer.write_schema.call_args_list[0][0][1]
+        accounts_schema = ctx.writer.write_schema.call_args_list[1][0][1]
+        self.assertIn("_sdc_deleted_at", currencies_schema["properties"])
+        self.assertNotIn("_sdc_deleted_at", accounts_schema["properties"])
@@ -0,0 +1,93 @@
+import copy
+import decimal
+import unittest
+
+from singer import metadata, Transformer
+from singer.transform import SchemaMismatch
+
+import tap_xero
+import tap_xero.streams as streams_
+from tap_xero.compiled_transform import RecordTransformer
+
+
+def sample_value(schema, depth=0):
+    """Builds a value covering every property of the schema."""
+    types = schema.get("type", [])
+    if not isinstance(types, list):
+        types = [types]
+    if schema.get("format") == "date-time":
+        return "2021-04-01T10:20:30.000000Z"
+    if "object" in types:
+        return {key: sample_value(sub_schema, depth + 1)
+                for key, sub_schema in schema.get("properties", {}).items()}
+    if "array" in types:
+        return [sample_value(schema["items"], depth + 1) for _ in range(2)]
+    if "number" in types:
+        return decimal.Decimal("12.50")
+    if "integer" in types:
+        return "1,024"
+    if "boolean" in types:
+        return "false"
+    return "value"
+
+
+class TestCompiledTransform(unittest.TestCase):
+    """
+    Test cases to verify that the compiled transform matches the singer Transformer
+    """
+
+    def test_matches_transformer_for_all_streams(self):
+        for stream in streams_.all_streams:
+            schema = tap_xero.load_schema(stream.tap_stream_id)
+            mdata = tap_xero.load_metadata(stream, schema)
+            # Deselect one non-automatic field to exercise metadata filtering
+            mdata_map = metadata.to_map(mdata)
+            for breadcrumb, field_mdata in mdata_map.items():
+                if breadcrumb and field_mdata.get("inclusion") == "available":
+                    field_mdata["selected"] = False
+                    break
+            mdata = metadata.to_list(mdata_map)
+
+            record = sample_value(schema)
+            record["UnknownField"] = "dropped"
+
+            expected = Transformer().transform(copy.deepcopy(record), copy.deepcopy(schema),
+                                               metadata.to_map(mdata))
+            transformer = RecordTransformer(schema, mdata)
+            self.assertIsNotNone(transformer.compiled)
+            self.assertEqual(transformer.transform(copy.deepcopy(record)), expected,
+                             stream.tap_stream_id)
+
+    def test_null_and_empty_values(self):
+        schema = {"type": ["null", "object"], "properties": {
+            "Date": {"type": ["null", "string"], "format": "date-time"},
+            "Name": {"type": ["null", "string"]},
+            "Total": {"type": ["null", "number"]},
+        }}
+        record = {"Date": "", "Name": None, "Total": ""}
+
+        self.assertEqual(RecordTransformer(schema, []).transform(dict(record)),
+                         Transformer().transform(dict(record), schema))
+
+    def test_non_canonical_dates_are_converted(self):
+        schema = {"type": "object", "properties": {"Date": {"type": "string", "format": "date-time"}}}
+
+        self.assertEqual(RecordTransformer(schema, []).transform({"Date": "2021-04-01T10:20:30+0100"}),
+                         {"Date": "2021-04-01T09:20:30.000000Z"})
+
+    def test_mismatch_raises_schema_mismatch(self):
+        schema = {"type": "object", "properties": {"Total": {"type": ["null", "number"]}}}
+
+        with self.assertRaises(SchemaMismatch):
+            RecordTransformer(schema, []).transform({"Total": "abc"})
+
+    def test_nested_metadata_uses_transformer(self):
+        schema = {"type": "object", "properties": {
+            "Contact": {"type": "object", "properties": {"Name": {"type": "string"}, "Email": {"type": "string"}}}}}
+        mdata = [{"breadcrumb": ["properties", "Contact", "properties", "Email"],
+                  "metadata": {"selected": False}}]
+        transformer = RecordTransformer(schema, mdata)
+
+        self.assertIsNone(transformer.compiled)
+        self.assertEqual(transformer.transform({"Contact": {"Name": "a", "Email": "b"}}),
+                         {"Contact": {"Name": "a"}})
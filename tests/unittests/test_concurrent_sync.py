@@ -0,0 +1,103 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+import tap_xero
+import tap_xero.streams as streams_
+
+from sync_helpers import MockCatalog, build_context as build_sync_context
+
+
+def build_context(config, state, stream_ids):
+    ctx = build_sync_context(config, state, MockCatalog(stream_ids))
+    ctx.refresh_credentials = mock.Mock()
+    return ctx
+
+
+@mock.patch("tap_xero.load_and_write_schema")
+class TestConcurrentSync(unittest.TestCase):
+    """
+    Test cases to verify that streams can be synced on a pool of worker threads
+    """
+
+    def test_all_selected_streams_are_synced(self, mocked_write_schema):
+        stream_ids = ["accounts", "currencies", "tax_rates", "invoices"]
+        ctx = build_context({"max_stream_workers": "3"}, {}, stream_ids)
+        synced = []
+        lock = threading.Lock()
+
+        def fake_sync(stream, ctx):
+            with lock:
+                synced.append(stream.tap_stream_id)
+
+        with mock.patch.object(tap_xero, "sync_stream", side_effect=lambda c, s: fake_sync(s, c)):
+            tap_xero.sync(ctx)
+
+        self.assertEqual(sorted(synced), sorted(stream_ids))
+        self.assertEqual(mocked_write_schema.call_count, len(stream_ids))
+        # Nothing is left in flight once the sync completes
+        self.assertNotIn("syncing_streams", ctx.state)
+        self.assertIsNone(ctx.state["currently_syncing"])
+
+    def test_interrupted_streams_are_resumed_first(self, mocked_write_schema):
+        stream_ids = ["bank_transactions", "contacts", "accounts", "tax_rates"]
+        state = {"syncing_streams": ["tax_rates"], "currently_syncing": "accounts"}
+        ctx = build_context({"max_stream_workers": 2}, state, stream_ids)
+        submitted = []
+
+        with mock.patch.object(tap_xero, "sync_concurrently",
+                               side_effect=lambda c, s, w: submitted.extend(x.tap_stream_id for x in s)):
+            tap_xero.sync(ctx)
+
+        self.assertEqual(submitted[:2], ["accounts", "tax_rates"])
+        self.assertEqual(sorted(submitted), sorted(stream_ids))
+
+    def test_worker_failure_is_raised(self, mocked_write_schema):
+        ctx = build_context({"max_stream_workers": 2}, {}, ["accounts", "currencies"])
+
+        def fake_sync(ctx, stream):
+            if stream.tap_stream_id == "currencies":
+                raise RuntimeError("boom")
+
+        with mock.patch.object(tap_xero, "sync_stream", side_effect=fake_sync):
+            with self.assertRaises(RuntimeError):
+                tap_xero.sync(ctx)
+
+        # The failed stream stays marked as in flight so it is resumed first
+        self.assertIn("currencies", ctx.state["syncing_streams"])
+
+    def test_failure_stops_running_streams(self, mocked_write_schema):
+        ctx = build_context({"max_stream_workers": 2}, {}, ["accounts", "currencies"])
+        started = threading.Event()
+        pages = []
+
+        def fake_sync(ctx, stream):
+            if stream.tap_stream_id == "currencies":
+                started.wait(5)
+                raise RuntimeError("boom")
+            # Pages until it is stopped
+            for page in range(1, 10000):
+                streams_._make_request(ctx, "accounts", {"page": page})
+                pages.append(page)
+                started.set()
+                time.sleep(0.001)
+
+        ctx.client.filter = mock.Mock(return_value=[])
+        with mock.patch.object(tap_xero, "sync_stream", side_effect=fake_sync):
+            with self.assertRaises(RuntimeError):
+                tap_xero.sync(ctx)
+
+        self.assertTrue(ctx.stopped.is_set())
+        self.assertLess(len(pages), 9999)
+
+    def test_single_worker_keeps_serial_behaviour(self, mocked_write_schema):
+        ctx = build_context({}, {"currently_syncing": "accounts"}, ["contacts", "accounts", "currencies"])
+        synced = []
+
+        with mock.patch.object(tap_xero, "sync_stream", side_effect=lambda c, s: synced.append(s.tap_stream_id)):
+            tap_xero.sync(ctx)
+
+        # Streams before the one being synced are skipped, as before
+        self.assertEqual(synced, ["accounts", "currencies"])
+        self.assertEqual(synced, [s for s in streams_.all_stream_ids if s in synced])
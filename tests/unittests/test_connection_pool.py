@@ -0,0 +1,197 @@
+import gc
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+
+import tap_xero.client as client_
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.request_count += 1
+            count = self.server.request_count
+        if count <= self.server.drop_first:
+            # Close the connection without answering, as a reset would
+            self.close_connection = True
+            return
+        time.sleep(self.server.delay)
+        body = b'{"Status": "OK"}'
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class LocalServer:
+    def __init__(self, drop_first=0, delay=0):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.request_count = 0
+        self.server.drop_first = drop_first
+        self.server.delay = delay
+        self.url = "http://127.0.0.1:{}/".format(self.server.server_address[1])
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestConnectionPool(unittest.TestCase):
+    """
+    Test cases to verify the pool size, connection retries, timeouts and pool metrics
+    """
+
+    def test_pool_size_covers_every_tenant(self):
+        session = client_.build_session({"tenant_id": "a,b,c", "max_concurrent_requests": 4})
+
+        self.assertEqual(session.get_adapter("https://api.xero.com")._pool_maxsize, 12)
+
+    def test_configured_pool_size(self):
+        session = client_.build_session({"tenant_id": "a", "http_pool_size": "25"})
+
+        self.assertEqual(session.get_adapter("https://api.xero.com")._pool_maxsize, 25)
+
+    def test_get_is_retried_after_a_dropped_connection(self):
+        session = client_.build_session({"tenant_id": "a"})
+        with LocalServer(drop_first=1) as server:
+            response = session.get(server.url, timeout=5)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server.server.request_count, 2)
+
+    def test_stalled_request_times_out(self):
+        xero_client = client_.XeroClient({"tenant_id": "a", "request_timeout": 1, "connection_retries": 0})
+        with LocalServer(delay=3) as server:
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                xero_client.session.get(server.url, timeout=xero_client.timeout)
+
+    @mock.patch("tap_xero.client.metrics.log")
+    def test_pool_hits_and_misses_are_logged(self, mocked_log):
+        xero_client = client_.XeroClient({"tenant_id": "a"})
+        with LocalServer() as server:
+            for _ in range(3):
+                xero_client.session.get(server.url, timeout=5).raise_for_status()
+            xero_client.log_pool_metrics()
+
+        points = {call[0][1].metric: call[0][1].value for call in mocked_log.call_args_list}
+        self.assertEqual(points, {"http_pool_requests": 3, "http_pool_hits": 2, "http_pool_misses": 1})
+
+
+class MockBodyResponse:
+    """Records whether a concurrency permit was free while its body was read"""
+    headers = {}
+    encoding = "utf-8"
+
+    def __init__(self, limiter, status_code=200):
+        self.limiter = limiter
+        self.status_code = status_code
+        self.permit_free_while_reading = None
+        self.closed = False
+
+    def read_body(self):
+        self.permit_free_while_reading = self.limiter.concurrency.acquire(blocking=False)
+        if self.permit_free_while_reading:
+            self.limiter.concurrency.release()
+        return '{"Accounts": [{"AccountID": "1"}]}'
+
+    @property
+    def text(self):
+        return self.read_body()
+
+    def iter_content(self, chunk_size):
+        yield self.read_body().encode("utf-8")
+
+    def close(self):
+        self.closed = True
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise requests.HTTPError("sample message")
+
+    def json(self):
+        return {}
+
+
+@mock.patch("tap_xero.client.metrics.log")
+class TestPermitCoversBody(unittest.TestCase):
+    """
+    Test cases to verify that a request keeps its concurrency permit until its body is read
+    """
+
+    def build_client(self):
+        xero_client = client_.XeroClient({"tenant_id": "a", "max_concurrent_requests": 1})
+        xero_client.access_token = "token"
+        xero_client.tenant_id = "a"
+        return xero_client
+
+    def assert_released(self, xero_client):
+        self.assertTrue(xero_client.rate_limiter.concurrency.acquire(blocking=False))
+        xero_client.rate_limiter.concurrency.release()
+
+    def test_filter_holds_the_permit_while_reading(self, mocked_log):
+        xero_client = self.build_client()
+        response = MockBodyResponse(xero_client.rate_limiter)
+        with mock.patch("requests.Session.send", return_value=response):
+            xero_client.filter("accounts")
+
+        self.assertFalse(response.permit_free_while_reading)
+        self.assert_released(xero_client)
+
+    def test_streamed_body_holds_the_permit_while_reading(self, mocked_log):
+        xero_client = self.build_client()
+        response = MockBodyResponse(xero_client.rate_limiter)
+        with mock.patch("requests.Session.send", return_value=response):
+            records = list(xero_client.filter_stream("accounts"))
+
+        self.assertEqual(records, [{"AccountID": "1"}])
+        self.assertFalse(response.permit_free_while_reading)
+        self.assert_released(xero_client)
+
+    def test_unread_result_releases_the_permit(self, mocked_log):
+        xero_client = self.build_client()
+        response = MockBodyResponse(xero_client.rate_limiter)
+        with mock.patch("requests.Session.send", return_value=response):
+            records = xero_client.filter_stream("accounts")
+            self.assertFalse(xero_client.rate_limiter.concurrency.acquire(blocking=False))
+
+        del records
+        gc.collect()
+
+        self.assertTrue(response.closed)
+        self.assert_released(xero_client)
+
+    def test_closed_result_releases_the_permit_once(self, mocked_log):
+        xero_client = self.build_client()
+        response = MockBodyResponse(xero_client.rate_limiter)
+        with mock.patch("requests.Session.send", return_value=response):
+            records = xero_client.filter_stream("accounts")
+            self.assertEqual(next(records), {"AccountID": "1"})
+            records.close()
+            list(records)
+
+        # A second release would overflow the BoundedSemaphore
+        self.assert_released(xero_client)
+
+    def test_error_response_releases_the_permit(self, mocked_log):
+        xero_client = self.build_client()
+        response = MockBodyResponse(xero_client.rate_limiter, status_code=404)
+        with mock.patch("requests.Session.send", return_value=response):
+            with self.assertRaises(client_.XeroNotFoundError):
+                xero_client.filter_stream("accounts")
+
+        self.assert_released(xero_client)
@@ -1,3 +1,4 @@
+import tap_xero.client as client_
 from tap_xero.client import parse_date
 from singer.utils import strptime_to_utc
 import unittest
@@ -54,3 +55,44 @@ class TestDatetimeParsing(unittest.TestCase):
         expected_dates = [None, None, None, None]
 
         self.assertEquals(parsed_dates, expected_dates)
+
+
+class TestObjectHook(unittest.TestCase):
+
+    def test_all_date_strings_are_converted_by_default(self):
+        record = client_._json_load_object_hook({
+            "Name": "Acme /Date lookalike",
+            "DueDate": "/Date(1603895333000+0000)/",
+            "Reference": "2020-10-20T12:30:00",
+        })
+
+        self.assertEqual(record, {
+            "Name": "Acme /Date lookalike",
+            "DueDate": "2020-10-28T14:28:53.000000Z",
+            "Reference": "2020-10-20T12:30:00.000000Z",
+        })
+
+    def test_only_schema_date_keys_are_converted(self):
+        schema = {
+            "type": "object",
+            "properties": {
+                "DueDate": {"type": ["null", "string"], "format": "date-time"},
+                "Reference": {"type": ["null", "string"]},
+                "LineItems": {
+                    "type": ["null", "array"],
+                    "items": {"properties": {"Date": {"type": ["null", "string"], "format": "date-time"}}}
+                },
+            }
+        }
+        decode = client_.make_record_decoder(schema)
+
+        record = decode({"DueDate": "/Date(1603895333000+0000)/", "Reference": "2020-10-20T12:30:00",
+                         "LineItems": [{"Date": "/Date(0+0000)/"}]})
+
+        self.assertEqual(record, {"DueDate": "2020-10-28T14:28:53.000000Z", "Reference": "2020-10-20T12:30:00",
+                                  "LineItems": [{"Date": "1970-01-01T00:00:00.000000Z"}]})
+
+    def test_undeclared_end_date_is_converted(self):
+        decode = client_.make_record_decoder({"type": "object", "properties": {}})
+
+        self.assertEqual(decode({"EndDate": "/Date(0+0000)/"}), {"EndDate": "1970-01-01T00:00:00.000000Z"})
@@ -0,0 +1,185 @@
+import json
+import unittest
+from unittest import mock
+
+from singer import metadata
+
+import tap_xero
+import tap_xero.client as client_
+import tap_xero.streams as streams_
+from tap_xero.context import Context
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "InvoiceID": {"type": ["string"]},
+        "DueDate": {"type": ["null", "string"], "format": "date-time"},
+        "Reference": {"type": ["null", "string"]},
+        "LineItems": {"type": ["null", "array"],
+                      "items": {"type": ["object"],
+                                "properties": {"Date": {"type": ["null", "string"], "format": "date-time"},
+                                               "Amount": {"type": ["null", "number"]}}}},
+        "Schedule": {"type": ["null", "object"], "properties": {"EndDate": {"type": ["null", "string"]}}},
+        "Extra": {},
+    },
+}
+RAW_DATE = "/Date(1603895333000+0000)/"
+DATE = "2020-10-28T14:28:53.000000Z"
+
+
+def build_mdata(deselected):
+    mdata = metadata.new()
+    for field in SCHEMA["properties"]:
+        mdata = metadata.write(mdata, ("properties", field), "inclusion", "available")
+    for field in deselected:
+        mdata = metadata.write(mdata, ("properties", field), "selected", False)
+    return metadata.to_list(mdata)
+
+
+def build_record():
+    return {"InvoiceID": "1", "DueDate": RAW_DATE, "Reference": "2020-10-20T12:30:00",
+            "LineItems": [{"Date": RAW_DATE, "Amount": 1}],
+            "Schedule": {"EndDate": RAW_DATE},
+            "Extra": {"Nested": {"DueDate": RAW_DATE}}}
+
+
+class MockResponse:
+    status_code = 200
+    headers = {}
+    encoding = "utf-8"
+
+    def __init__(self, records):
+        self.text = json.dumps({"Invoices": records})
+
+    def iter_content(self, chunk_size):
+        yield self.text.encode("utf-8")
+
+    def close(self):
+        pass
+
+
+class TestRecordDecoder(unittest.TestCase):
+    """
+    Test cases to verify that records are decoded only as far as the catalog selects
+    """
+
+    def test_deselected_fields_are_dropped_and_not_converted(self):
+        decode = client_.make_record_decoder(SCHEMA, {"LineItems"})
+        record = build_record()
+        line_items = record["LineItems"]
+
+        self.assertEqual(decode(record), {
+            "InvoiceID": "1", "DueDate": DATE, "Reference": "2020-10-20T12:30:00",
+            "Schedule": {"EndDate": DATE}, "Extra": {"Nested": {"DueDate": DATE}}})
+        self.assertEqual(line_items, [{"Date": RAW_DATE, "Amount": 1}])
+
+    def test_matches_converting_every_date_key(self):
+        expected = build_record()
+        client_._convert_all_dates(expected, client_.get_date_time_keys(SCHEMA))
+
+        decode = client_.make_record_decoder(SCHEMA)
+
+        self.assertEqual(decode(build_record()), expected)
+
+    def test_every_stream_matches_converting_every_date_key(self):
+        for stream in streams_.all_streams:
+            schema = tap_xero.load_schema(stream.tap_stream_id)
+            expected = self.sample(schema)
+            client_._convert_all_dates(expected, client_.get_date_time_keys(schema))
+
+            decode = client_.make_record_decoder(schema)
+
+            self.assertEqual(decode(self.sample(schema)), expected, stream.tap_stream_id)
+
+    def sample(self, schema, key=None, depth=0):
+        types = schema.get("type", [])
+        types = types if isinstance(types, list) else [types]
+        if "object" in types and depth < 4:
+            return {sub_key: self.sample(sub_schema, sub_key, depth + 1)
+                    for sub_key, sub_schema in schema.get("properties", {}).items()}
+        if "array" in types and depth < 4:
+            return [self.sample(schema["items"], key, depth + 1)]
+        return RAW_DATE
+
+
+@mock.patch("tap_xero.client.metrics.log")
+class TestClientProjection(unittest.TestCase):
+
+    def build_client(self, deselected):
+        xero_client = client_.XeroClient({})
+        xero_client.access_token = "token"
+        xero_client.tenant_id = "tenant"
+        xero_client.configure_stream("invoices", SCHEMA, build_mdata(deselected))
+        return xero_client
+
+    def test_filter_decodes_selected_fields(self, mocked_log):
+        xero_client = self.build_client(["LineItems", "Extra"])
+
+        with mock.patch("requests.Session.send", return_value=MockResponse([build_record()])):
+            records = xero_client.filter("invoices")
+
+        self.assertEqual(records, [{"InvoiceID": "1", "DueDate": DATE, "Reference": "2020-10-20T12:30:00",
+                                    "Schedule": {"EndDate": DATE}}])
+
+    def test_streamed_records_are_decoded_the_same(self, mocked_log):
+        xero_client = self.build_client(["LineItems", "Extra"])
+
+        with mock.patch("requests.Session.send", return_value=MockResponse([build_record()])):
+            records = list(xero_client.filter_stream("invoices"))
+
+        self.assertEqual(records, [{"InvoiceID": "1", "DueDate": DATE, "Reference": "2020-10-20T12:30:00",
+                                    "Schedule": {"EndDate": DATE}}])
+
+    def test_nested_deselection_drops_nothing(self, mocked_log):
+        mdata = metadata.to_map(build_mdata([]))
+        mdata[("properties", "LineItems", "items", "properties", "Amount")] = {"selected": False}
+        xero_client = client_.XeroClient({})
+        xero_client.access_token = "token"
+        xero_client.tenant_id = "tenant"
+        xero_client.configure_stream("invoices", SCHEMA, metadata.to_list(mdata))
+
+        with mock.patch("requests.Session.send", return_value=MockResponse([build_record()])):
+            records = xero_client.filter("invoices")
+
+        self.assertEqual(records[0]["LineItems"], [{"Date": DATE, "Amount": 1}])
+
+
+class MockCatalog:
+    def __init__(self, mdata):
+        self.mdata = mdata
+
+    def get_stream(self, tap_stream_id):
+        return mock.Mock(metadata=self.mdata)
+
+
+class TestSummaryOnlyRequests(unittest.TestCase):
+    """
+    Test cases to verify that invoices are requested in summary form only when
+    nothing the summary omits is selected
+    """
+
+    def filter_options(self, config, deselected):
+        stream = next(s for s in streams_.all_streams if s.tap_stream_id == "invoices")
+        schema = tap_xero.load_schema("invoices")
+        mdata = metadata.to_map(tap_xero.load_metadata(stream, schema))
+        for field in deselected:
+            mdata[("properties", field)]["selected"] = False
+        ctx = Context(dict({"start_date": "2021-01-01T00:00:00Z"}, **config), {},
+                      MockCatalog(metadata.to_list(mdata)), None)
+        return stream.get_filter_options(ctx, "2021-01-01T00:00:00Z", None)
+
+    def test_summary_only_when_heavy_fields_are_deselected(self):
+        options = self.filter_options({"summary_only_requests": "true"}, streams_.INVOICE_SUMMARY_OMITS)
+
+        self.assertEqual(options["summaryOnly"], "true")
+
+    def test_full_records_when_line_items_are_selected(self):
+        deselected = streams_.INVOICE_SUMMARY_OMITS - {"LineItems"}
+        options = self.filter_options({"summary_only_requests": "true"}, deselected)
+
+        self.assertNotIn("summaryOnly", options)
+
+    def test_full_records_by_default(self):
+        options = self.filter_options({}, streams_.INVOICE_SUMMARY_OMITS)
+
+        self.assertNotIn("summaryOnly", options)
@@ -0,0 +1,82 @@
+import unittest
+from unittest import mock
+
+import tap_xero.streams as stream_
+
+from sync_helpers import build_context as build_sync_context, run_stream_sync
+
+
+def build_context(partitions, journal_number=None):
+    state = {}
+    if journal_number is not None:
+        state = {"bookmarks": {"journals": {"JournalNumber": journal_number}}}
+    return build_sync_context({"start_date": "2020-01-01T00:00:00Z", "journal_partitions": partitions}, state)
+
+
+def journals_after(offset, last, skip=()):
+    numbers = [number for number in range(offset + 1, last + 1) if number not in skip]
+    return [{"JournalID": str(number), "JournalNumber": number} for number in numbers[:100]]
+
+
+@mock.patch.object(stream_.Journals, "write_records")
+class TestJournalPartitions(unittest.TestCase):
+    """
+    Test cases to verify that journal number windows are fetched in parallel
+    but written and bookmarked in order
+    """
+
+    def run_sync(self, ctx, responses):
+        stream = stream_.Journals("journals", ["JournalID"], bookmark_key="JournalNumber")
+        calls = run_stream_sync(stream, ctx, lambda options: responses(options["offset"]))
+        return [options["offset"] for options in calls]
+
+    def written_numbers(self, mocked_write):
+        return [record["JournalNumber"] for call in mocked_write.call_args_list for record in call[0][0]]
+
+    def test_windows_are_written_in_order(self, mocked_write):
+        ctx = build_context(4)
+
+        requested = self.run_sync(ctx, lambda offset: journals_after(offset, 350))
+
+        self.assertEqual(self.written_numbers(mocked_write), list(range(1, 351)))
+        self.assertEqual(ctx.get_bookmark(["journals", "JournalNumber"]), 350)
+        self.assertEqual(requested[:1], [0])
+        self.assertEqual(sorted(requested), [0, 100, 200, 300, 400, 500, 600])
+
+    def test_incremental_sync_fetches_one_window(self, mocked_write):
+        ctx = build_context(4, journal_number=1000)
+
+        requested = self.run_sync(ctx, lambda offset: journals_after(offset, 1020))
+
+        self.assertEqual(requested, [1000])
+        self.assertEqual(self.written_numbers(mocked_write), list(range(1001, 1021)))
+
+    def test_gaps_are_not_written_twice(self, mocked_write):
+        ctx = build_context(2)
+
+        self.run_sync(ctx, lambda offset: journals_after(offset, 250, skip={50, 51}))
+
+        numbers = self.written_numbers(mocked_write)
+        self.assertEqual(numbers, [n for n in range(1, 251) if n not in (50, 51)])
+
+    def test_bookmark_stops_at_the_last_written_window(self, mocked_write):
+        ctx = build_context(4)
+
+        def responses(offset):
+            if offset == 200:
+                raise RuntimeError("Connection reset")
+            return journals_after(offset, 1000)
+
+        with self.assertRaises(RuntimeError):
+            self.run_sync(ctx, responses)
+
+        self.assertEqual(self.written_numbers(mocked_write), list(range(1, 201)))
+        self.assertEqual(ctx.get_bookmark(["journals", "JournalNumber"]), 200)
+
+    def test_serial_by_default(self, mocked_write):
+        ctx = build_context(1)
+
+        requested = self.run_sync(ctx, lambda offset: journals_after(offset, 150, skip={20}))
+
+        self.assertEqual(requested, [0, 101])
+        self.assertEqual(self.written_numbers(mocked_write), [n for n in range(1, 151) if n != 20])
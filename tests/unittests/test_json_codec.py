@@ -0,0 +1,95 @@
+import decimal
+import importlib.util
+import json
+import pickle
+import unittest
+from unittest import mock
+
+import tap_xero.client as client_
+from tap_xero import json_codec
+from tap_xero.output import serialize_records
+
+HAS_ORJSON = importlib.util.find_spec("orjson") is not None
+BODY = '{"Invoices": [{"InvoiceID": "1", "Total": 40.00, "LineCount": 2, "Name": "Caf\\u00e9",' \
+       ' "UpdatedDateUTC": "/Date(1603895333000+0000)/"}]}'
+
+
+class TestCodecSelection(unittest.TestCase):
+    """
+    Test cases to verify that the JSON backend is chosen from the config
+    """
+
+    def test_stdlib_by_default(self):
+        self.assertEqual(json_codec.build_codec({}).name, "stdlib")
+
+    @unittest.skipUnless(HAS_ORJSON, "orjson is not installed")
+    def test_auto_prefers_orjson(self):
+        self.assertEqual(json_codec.build_codec({"json_backend": "auto"}).name, "orjson")
+
+    def test_missing_backend_falls_back_to_stdlib(self):
+        with mock.patch("tap_xero.json_codec.importlib.import_module", side_effect=ImportError):
+            codec = json_codec.get_codec.__wrapped__("ujson")
+
+        self.assertEqual(codec.name, "stdlib")
+
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ValueError):
+            json_codec.build_codec({"json_backend": "simplejson"})
+
+    def test_codec_can_be_pickled(self):
+        codec = json_codec.build_codec({"json_backend": "auto"})
+
+        self.assertIs(pickle.loads(pickle.dumps(codec)), codec)
+
+
+@unittest.skipUnless(HAS_ORJSON, "orjson is not installed")
+class TestFastCodec(unittest.TestCase):
+    """
+    Test cases to verify that the fast codec decodes and encodes the same values as the stdlib one
+    """
+
+    def setUp(self):
+        self.codec = json_codec.get_codec("orjson")
+        self.stdlib = json_codec.get_codec("stdlib")
+
+    def test_amounts_keep_their_value(self):
+        record = self.codec.loads(BODY)["Invoices"][0]
+
+        self.assertEqual(record, self.stdlib.loads(BODY)["Invoices"][0])
+        self.assertEqual(decimal.Decimal(repr(record["Total"])), decimal.Decimal("40.00"))
+
+    def test_long_numbers_are_decoded_exactly(self):
+        body = '{"Total": 12345678901234.5678}'
+
+        self.assertEqual(self.codec.loads(body), {"Total": decimal.Decimal("12345678901234.5678")})
+
+    def test_invalid_body_raises_the_usual_error(self):
+        with self.assertRaises(json.JSONDecodeError):
+            self.codec.loads('{"Invoices": [')
+
+    def test_record_lines_match_singer(self):
+        records = [{"InvoiceID": "1", "Total": "40.00", "Name": "Café", "Lines": [{"Amount": 1.5}]},
+                   {"InvoiceID": "2", "Total": decimal.Decimal("12.50")}]
+
+        lines = serialize_records("invoices", records, self.codec)
+        expected = serialize_records("invoices", records, self.stdlib)
+
+        self.assertEqual([json.loads(line) for line in lines], [json.loads(line) for line in expected])
+        self.assertTrue(lines[0].startswith('{"type": "RECORD", "stream": "invoices", "record": {'))
+        # Decimals are left to singer, which writes them as numbers
+        self.assertEqual(lines[1], expected[1])
+
+    @mock.patch("tap_xero.client.metrics.log")
+    def test_client_converts_dates_after_decoding(self, mocked_log):
+        xero_client = client_.XeroClient({"json_backend": "orjson"})
+        xero_client.access_token = "token"
+        xero_client.tenant_id = "tenant"
+        xero_client.configure_stream("invoices", {"type": "object", "properties": {
+            "UpdatedDateUTC": {"type": ["null", "string"], "format": "date-time"}}})
+        response = mock.Mock(status_code=200, headers={}, text=BODY, _content=None, raw=None)
+
+        with mock.patch("requests.Session.send", return_value=response):
+            records = xero_client.filter("invoices")
+
+        self.assertEqual(records[0]["UpdatedDateUTC"], "2020-10-28T14:28:53.000000Z")
+        self.assertEqual(records[0]["Name"], "Café")
@@ -0,0 +1,54 @@
+import unittest
+from unittest import mock
+
+import tap_xero.streams as stream_
+
+from sync_helpers import build_context, page_responses, run_stream_sync
+
+
+def build_pages(*dates_per_page):
+    return {page_num: [{"LinkedTransactionID": "{}-{}".format(page_num, i), "UpdatedDateUTC": date}
+                       for i, date in enumerate(dates)]
+            for page_num, dates in enumerate(dates_per_page, start=1)}
+
+
+@mock.patch.object(stream_.LinkedTransactions, "write_records")
+class TestLinkedTransactions(unittest.TestCase):
+    """
+    Test cases to verify that linked transactions are paged on the raw page size
+    and bookmarked on the newest record seen
+    """
+
+    def run_sync(self, pages, bookmark="2021-01-01T00:00:00Z"):
+        state = {"bookmarks": {"linked_transactions": {"UpdatedDateUTC": bookmark}}}
+        ctx = build_context({"start_date": "2020-01-01T00:00:00Z"}, state)
+        stream = stream_.LinkedTransactions("linked_transactions", ["LinkedTransactionID"])
+        calls = run_stream_sync(stream, ctx, page_responses(pages))
+        return ctx, [c["page"] for c in calls]
+
+    def test_paging_continues_past_filtered_pages(self, mocked_write):
+        # The first page holds only old records, which used to end the sync
+        pages = build_pages(["2020-06-01T00:00:00Z"] * 100,
+                            ["2021-03-01T00:00:00Z"] + ["2020-06-01T00:00:00Z"] * 99,
+                            ["2021-02-01T00:00:00Z"] * 3)
+
+        ctx, requested = self.run_sync(pages)
+
+        self.assertEqual(requested, [1, 2, 3])
+        self.assertEqual([len(call[0][0]) for call in mocked_write.call_args_list], [1, 3])
+
+    def test_bookmark_is_the_newest_record_on_any_page(self, mocked_write):
+        pages = build_pages(["2021-03-01T00:00:00Z", "2021-02-01T00:00:00Z"])
+
+        ctx, requested = self.run_sync(pages)
+
+        self.assertEqual(requested, [1])
+        self.assertEqual(ctx.get_bookmark(["linked_transactions", "UpdatedDateUTC"]), "2021-03-01T00:00:00Z")
+
+    def test_bookmark_is_kept_when_nothing_is_new(self, mocked_write):
+        pages = build_pages(["2020-06-01T00:00:00Z"])
+
+        ctx, requested = self.run_sync(pages)
+
+        mocked_write.assert_not_called()
+        self.assertEqual(ctx.get_bookmark(["linked_transactions", "UpdatedDateUTC"]), "2021-01-01T00:00:00Z")
@@ -0,0 +1,63 @@
+import io
+import json
+import unittest
+from unittest import mock
+
+from tap_xero.output import MessageWriter, build_writer
+
+
+class TestMessageWriter(unittest.TestCase):
+    """
+    Test cases to verify that buffered output keeps STATE behind the records it covers
+    """
+
+    def written_messages(self, stdout):
+        return [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    @mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_records_are_buffered_until_flush(self, stdout):
+        writer = MessageWriter(flush_interval=60)
+        writer.write_records("accounts", [{"AccountID": "1"}, {"AccountID": "2"}])
+
+        self.assertEqual(stdout.getvalue(), "")
+
+        writer.flush()
+        messages = self.written_messages(stdout)
+        self.assertEqual([m["record"]["AccountID"] for m in messages], ["1", "2"])
+
+    @mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_state_is_coalesced_and_written_after_records(self, stdout):
+        writer = MessageWriter(flush_interval=60)
+        state = {"bookmarks": {"accounts": {"UpdatedDateUTC": "a"}}}
+        writer.write_state(state)
+        writer.write_records("accounts", [{"AccountID": "1"}])
+        state["bookmarks"]["accounts"]["UpdatedDateUTC"] = "b"
+        writer.write_state(state)
+        writer.flush()
+
+        messages = self.written_messages(stdout)
+        self.assertEqual([m["type"] for m in messages], ["RECORD", "STATE"])
+        self.assertEqual(messages[1]["value"]["bookmarks"]["accounts"]["UpdatedDateUTC"], "b")
+
+    @mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_full_buffer_is_flushed(self, stdout):
+        writer = MessageWriter(buffer_size=100, flush_interval=60)
+        writer.write_records("accounts", [{"AccountID": str(i)} for i in range(5)])
+
+        self.assertEqual(len(self.written_messages(stdout)), 5)
+
+    @mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_schema_flushes_pending_messages_first(self, stdout):
+        writer = MessageWriter(flush_interval=60)
+        writer.write_records("accounts", [{"AccountID": "1"}])
+        writer.write_schema("currencies", {"type": "object"}, ["Code"])
+
+        messages = self.written_messages(stdout)
+        self.assertEqual([m["type"] for m in messages], ["RECORD", "SCHEMA"])
+
+    @mock.patch("sys.stdout", new_callable=io.StringIO)
+    def test_zero_buffer_size_writes_immediately(self, stdout):
+        writer = build_writer({"output_buffer_size": "0"})
+        writer.write_records("accounts", [{"AccountID": "1"}])
+
+        self.assertEqual(len(self.written_messages(stdout)), 1)
@@ -0,0 +1,120 @@
+import threading
+import unittest
+from unittest import mock
+
+import tap_xero
+import tap_xero.client as client_
+import tap_xero.streams as streams_
+from tap_xero.context import Context
+
+from sync_helpers import MockCatalog, build_context as build_sync_context
+
+
+def build_context(config, state=None, stream_ids=("accounts", "currencies")):
+    config = dict({"start_date": "2021-01-01T00:00:00Z"}, **config)
+    ctx = build_sync_context(config, state, MockCatalog(stream_ids))
+    ctx.refresh_credentials = mock.Mock()
+    return ctx
+
+
+class TestMultiTenantSync(unittest.TestCase):
+    """
+    Test cases to verify that several tenants are synced from one process
+    """
+
+    @mock.patch("tap_xero.load_and_write_schema")
+    def test_each_tenant_has_its_own_state(self, mocked_write_schema):
+        ctx = build_context({"tenant_id": "tenant-a, tenant-b"})
+        synced = []
+        lock = threading.Lock()
+
+        def fake_sync(tenant_ctx, stream):
+            with lock:
+                synced.append((tenant_ctx.tenant_id, tenant_ctx.client.tenant_id, stream.tap_stream_id))
+            tenant_ctx.set_bookmark([stream.tap_stream_id, "UpdatedDateUTC"], tenant_ctx.tenant_id)
+
+        with mock.patch.object(tap_xero, "sync_stream", side_effect=fake_sync):
+            tap_xero.sync(ctx)
+
+        self.assertEqual(sorted(synced), [
+            ("tenant-a", "tenant-a", "accounts"), ("tenant-a", "tenant-a", "currencies"),
+            ("tenant-b", "tenant-b", "accounts"), ("tenant-b", "tenant-b", "currencies"),
+        ])
+        self.assertNotIn("bookmarks", ctx.state)
+        for tenant_id in ["tenant-a", "tenant-b"]:
+            tenant_state = ctx.state["tenants"][tenant_id]
+            self.assertEqual(tenant_state["bookmarks"]["accounts"]["UpdatedDateUTC"], tenant_id)
+            self.assertIsNone(tenant_state["currently_syncing"])
+
+    def test_tenant_state_is_resumed(self):
+        state = {"tenants": {"tenant-a": {"currently_syncing": "currencies"}}}
+        ctx = build_context({"tenant_id": ["tenant-a", "tenant-b"]}, state)
+
+        tenant_ctx = ctx.for_tenant("tenant-a")
+
+        self.assertEqual(tenant_ctx.state, {"currently_syncing": "currencies"})
+        self.assertEqual(ctx.for_tenant("tenant-b").state, {})
+
+    def test_records_and_schema_are_tagged_with_tenant(self):
+        ctx = build_context({"tenant_id": "tenant-a,tenant-b"}).for_tenant("tenant-b")
+        transformer = mock.Mock(transform=dict)
+        ctx.get_record_transformer = mock.Mock(return_value=transformer)
+        ctx.writer = mock.Mock()
+
+        streams_.Stream("accounts", ["AccountID"]).write_records([{"AccountID": "1"}], ctx)
+        tap_xero.load_and_write_schema(ctx, streams_.Stream("accounts", ["AccountID"]))
+
+        ctx.writer.write_records.assert_called_with("accounts", [{"AccountID": "1", "TenantID": "tenant-b"}])
+        stream_id, schema, key_properties = ctx.writer.write_schema.call_args[0]
+        self.assertIn("TenantID", schema["properties"])
+        self.assertEqual(key_properties, ["TenantID", "AccountID"])
+
+    def test_single_tenant_records_are_not_tagged(self):
+        ctx = build_context({"tenant_id": "tenant-a"})
+        ctx.get_record_transformer = mock.Mock(return_value=mock.Mock(transform=dict))
+        ctx.writer = mock.Mock()
+
+        streams_.Stream("accounts", ["AccountID"]).write_records([{"AccountID": "1"}], ctx)
+
+        ctx.writer.write_records.assert_called_with("accounts", [{"AccountID": "1"}])
+
+
+class TestTenantClients(unittest.TestCase):
+
+    def test_tenant_ids_from_config(self):
+        self.assertEqual(client_.get_tenant_ids({"tenant_id": "abc"}), ["abc"])
+        self.assertEqual(client_.get_tenant_ids({"tenant_id": "a, b,"}), ["a", "b"])
+        self.assertEqual(client_.get_tenant_ids({"tenant_id": ["a", "b"]}), ["a", "b"])
+
+    def test_tenants_share_the_app_limit_only(self):
+        limiter = client_.RateLimiter()
+        tenant_limiter = limiter.for_tenant()
+
+        self.assertIs(tenant_limiter.app_minute, limiter.app_minute)
+        self.assertIs(tenant_limiter.lock, limiter.lock)
+        self.assertIsNot(tenant_limiter.minute, limiter.minute)
+        self.assertIsNot(tenant_limiter.day, limiter.day)
+        self.assertIsNot(tenant_limiter.concurrency, limiter.concurrency)
+
+    def test_tenants_share_the_connection_pool(self):
+        xero_client = client_.XeroClient({})
+        tenant_client = xero_client.for_tenant("tenant-b")
+
+        self.assertIs(tenant_client.session, xero_client.session)
+        self.assertEqual(tenant_client.tenant_id, "tenant-b")
+
+    def test_token_is_refreshed_once_for_all_tenants(self):
+        ctx = Context({"tenant_id": "tenant-a,tenant-b"}, {}, None, None)
+        ctx.client.access_token = "old"
+        tenant_a, tenant_b = ctx.for_tenant("tenant-a"), ctx.for_tenant("tenant-b")
+
+        def refresh(config, config_path, force=False):
+            ctx.client.access_token = "new"
+
+        with mock.patch.object(ctx.client, "refresh_credentials", side_effect=refresh) as mocked_refresh:
+            tenant_a.refresh_credentials()
+            tenant_b.refresh_credentials()
+
+        self.assertEqual(mocked_refresh.call_count, 1)
+        self.assertEqual(tenant_b.client.access_token, "new")
+        self.assertEqual(tenant_b.client.tenant_id, "tenant-b")
@@ -0,0 +1,83 @@
+import copy
+import json
+import unittest
+
+import tap_xero.streams as stream_
+
+from sync_helpers import build_catalog, build_context, build_pages, page_responses, run_stream_sync
+
+START_DATE = "2021-01-01T00:00:00Z"
+BOOKMARK = ["invoices", "UpdatedDateUTC"]
+
+
+class TestPageCheckpoints(unittest.TestCase):
+    """
+    Test cases to verify that paginated streams commit the page and the bookmark
+    after each page written, and resume from them
+    """
+
+    def run_sync(self, config, page_sizes, state=None, fail_on_page=None):
+        calls = []
+        ctx = build_context(dict({"start_date": START_DATE}, **config), state, build_catalog("invoices"))
+        states = []
+        ctx.writer.write_state.side_effect = lambda state: states.append(json.loads(json.dumps(state)))
+
+        try:
+            run_stream_sync(stream_.PaginatedStream("invoices", ["InvoiceID"]), ctx,
+                            page_responses(build_pages(page_sizes), fail_on_page), calls)
+        except RuntimeError:
+            pass
+        return ctx, calls, states
+
+    def test_bookmark_is_committed_with_each_page(self):
+        ctx, calls, states = self.run_sync({}, [100, 100, 7])
+
+        checkpoints = [(s["bookmarks"]["invoices"].get("offset", {}).get("page"),
+                        s["bookmarks"]["invoices"]["UpdatedDateUTC"]) for s in states]
+        self.assertEqual(checkpoints, [(1, START_DATE),
+                                       (2, "2021-04-01T00:00:00Z"),
+                                       (3, "2021-04-02T00:00:00Z"),
+                                       (4, "2021-04-03T00:00:00Z"),
+                                       (None, "2021-04-03T00:00:00Z")])
+        # The pages are fetched with the since they are numbered from
+        self.assertEqual({c["since"] for c in calls}, {START_DATE})
+
+    def test_interrupted_sync_resumes_its_pages(self):
+        ctx, calls, states = self.run_sync({}, [100, 100, 100, 7], fail_on_page=3)
+        self.assertEqual(states[-1]["bookmarks"]["invoices"],
+                         {"UpdatedDateUTC": "2021-04-02T00:00:00Z",
+                          "offset": {"page": 3, "page_size": 100, "since": START_DATE}})
+
+        ctx, calls, states = self.run_sync({}, [100, 100, 100, 7], state=copy.deepcopy(states[-1]))
+
+        self.assertEqual([(c["page"], c["since"]) for c in calls], [(3, START_DATE), (4, START_DATE)])
+        self.assertEqual(ctx.get_bookmark(BOOKMARK), "2021-04-04T00:00:00Z")
+        self.assertEqual(ctx.get_offset(["invoices", "since"]), None)
+
+    def test_lost_offset_resumes_from_the_last_page_written(self):
+        state = {"bookmarks": {"invoices": {"UpdatedDateUTC": "2021-04-02T00:00:00Z"}}}
+
+        ctx, calls, states = self.run_sync({}, [7], state=state)
+
+        self.assertEqual([(c["page"], c["since"]) for c in calls], [(1, "2021-04-02T00:00:00Z")])
+
+    def test_resumed_sync_does_not_move_the_bookmark_back(self):
+        state = {"bookmarks": {"invoices": {"UpdatedDateUTC": "2021-04-02T00:00:00Z",
+                                            "offset": {"page": 3, "page_size": 100, "since": START_DATE}}}}
+
+        ctx, calls, states = self.run_sync({}, [100, 100], state=state)
+
+        self.assertEqual(calls[0]["page"], 3)
+        self.assertEqual(ctx.get_bookmark(BOOKMARK), "2021-04-02T00:00:00Z")
+
+    def test_pipelined_sync_resumes_its_pages(self):
+        config = {"pipeline_pages": "true", "pipeline_depth": 2}
+        ctx, calls, states = self.run_sync(config, [100, 100, 100, 7], fail_on_page=3)
+        offsets = states[-1]["bookmarks"]["invoices"]["offset"]
+        self.assertEqual((offsets["page"], offsets["since"]), (3, START_DATE))
+        self.assertEqual(states[-1]["bookmarks"]["invoices"]["UpdatedDateUTC"], "2021-04-02T00:00:00Z")
+
+        ctx, calls, states = self.run_sync(config, [100, 100, 100, 7], state=copy.deepcopy(states[-1]))
+
+        self.assertEqual(sorted(c["page"] for c in calls), [3, 4])
+        self.assertEqual(ctx.get_bookmark(BOOKMARK), "2021-04-04T00:00:00Z")
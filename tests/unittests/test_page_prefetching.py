@@ -0,0 +1,101 @@
+import unittest
+
+import tap_xero.streams as stream_
+
+from sync_helpers import (build_catalog, build_context, build_pages, page_responses,
+                          run_stream_sync, written_records)
+
+START_DATE = "2021-04-01T00:00:00Z"
+
+
+def sync_pages(config, page_sizes, state=None, stream=None):
+    """Syncs the pages and returns the context, the filter options of the
+    requests and the pages checkpointed in the state, in order"""
+    stream = stream or stream_.PaginatedStream("invoices", ["InvoiceID"])
+    ctx = build_context(dict({"start_date": START_DATE}, **config), state,
+                        build_catalog(stream.tap_stream_id))
+    offsets = []
+    ctx.writer.write_state.side_effect = lambda state: offsets.append(
+        state["bookmarks"][stream.tap_stream_id].get("offset", {}).get("page"))
+    calls = run_stream_sync(stream, ctx, page_responses(build_pages(page_sizes)))
+    return ctx, calls, [page for page in offsets if page is not None]
+
+
+class TestPagePrefetching(unittest.TestCase):
+    """
+    Test cases to verify that pages fetched ahead of time are still written in order
+    """
+
+    def run_sync(self, config, page_sizes):
+        ctx, calls, offsets = sync_pages(config, page_sizes)
+        written = [record["InvoiceID"] for record in written_records(ctx)]
+        return ctx, written, [c["page"] for c in calls], offsets
+
+    def test_pages_are_written_in_order(self):
+        ctx, written, requested, offsets = self.run_sync({"prefetch_pages": "4"},
+                                                         [100, 100, 100, 100, 100, 30])
+
+        self.assertEqual(written, [r["InvoiceID"] for page in build_pages([100, 100, 100, 100, 100, 30]).values()
+                                   for r in page])
+        # The first page, then the page after each one written
+        self.assertEqual(offsets, [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(ctx.get_bookmark(["invoices", "UpdatedDateUTC"]), "2021-04-06T00:00:00Z")
+        # At most depth - 1 speculative pages are requested past the short page
+        self.assertLessEqual(max(requested), 6 + 3)
+
+    def test_prefetching_stops_on_empty_page(self):
+        ctx, written, requested, offsets = self.run_sync({"prefetch_pages": 3}, [100, 100])
+
+        self.assertEqual(len(written), 200)
+        self.assertEqual(offsets, [1, 2, 3])
+
+    def test_no_prefetching_by_default(self):
+        ctx, written, requested, offsets = self.run_sync({}, [100, 100, 5])
+
+        self.assertEqual(requested, [1, 2, 3])
+        self.assertEqual(len(written), 205)
+
+
+class TestPageSize(unittest.TestCase):
+    """
+    Test cases to verify that the configured page size is sent and used to stop paging
+    """
+
+    def run_sync(self, config, page_sizes, saved_offsets=None, stream=None):
+        state = {"bookmarks": {"invoices": {"offset": saved_offsets}}} if saved_offsets else None
+        ctx, calls, offsets = sync_pages(config, page_sizes, state, stream)
+        return calls
+
+    def test_page_size_is_sent_and_ends_paging(self):
+        calls = self.run_sync({"page_size": "500"}, [500, 500, 120])
+
+        self.assertEqual([c["page"] for c in calls], [1, 2, 3])
+        self.assertTrue(all(c["pageSize"] == 500 for c in calls))
+
+    def test_page_size_per_stream(self):
+        calls = self.run_sync({"page_size": {"invoices": 1000, "contacts": 200}}, [40])
+
+        self.assertEqual(calls[0]["pageSize"], 1000)
+
+    def test_page_size_not_sent_by_default(self):
+        calls = self.run_sync({}, [100, 3])
+
+        self.assertNotIn("pageSize", calls[0])
+        self.assertEqual(len(calls), 2)
+
+    def test_unsupported_stream_ignores_page_size(self):
+        stream = stream_.PaginatedStream("quotes", ["QuoteID"], supports_page_size=False)
+        calls = self.run_sync({"page_size": 1000}, [100, 3], stream=stream)
+
+        self.assertNotIn("pageSize", calls[0])
+        self.assertEqual(len(calls), 2)
+
+    def test_invalid_page_size_raises(self):
+        with self.assertRaises(ValueError):
+            self.run_sync({"page_size": 5000}, [1])
+
+    def test_saved_page_is_mapped_to_new_page_size(self):
+        # Page 11 of 100 starts at record 1000, which is page 3 of 500
+        calls = self.run_sync({"page_size": 500}, [], saved_offsets={"page": 11, "page_size": 100})
+
+        self.assertEqual(calls[0]["page"], 3)
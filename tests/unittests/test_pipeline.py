@@ -0,0 +1,48 @@
+import json
+import unittest
+
+import tap_xero.streams as stream_
+
+from sync_helpers import (build_catalog, build_context, build_pages, page_responses,
+                          run_stream_sync, written_records)
+
+
+class TestPagePipeline(unittest.TestCase):
+    """
+    Test cases to verify that pipelined pages are written in order and checkpointed
+    after they are written
+    """
+
+    def run_sync(self, config, page_sizes, fail_on_page=None):
+        ctx = build_context(dict({"start_date": "2021-01-01T00:00:00Z"}, **config), None,
+                            build_catalog("invoices"))
+        states = []
+        ctx.writer.write_state.side_effect = lambda state: states.append(
+            json.loads(json.dumps(state))["bookmarks"]["invoices"].get("offset", {}).get("page"))
+
+        calls = run_stream_sync(stream_.PaginatedStream("invoices", ["InvoiceID"]), ctx,
+                                page_responses(build_pages(page_sizes), fail_on_page))
+        written = [record["InvoiceID"] for record in written_records(ctx)]
+        return ctx, written, [c["page"] for c in calls], states
+
+    def test_pages_are_written_in_order(self):
+        ctx, written, requested, states = self.run_sync(
+            {"pipeline_pages": "true", "pipeline_depth": 2}, [100, 100, 100, 7])
+
+        expected = [r["InvoiceID"] for page in build_pages([100, 100, 100, 7]).values() for r in page]
+        self.assertEqual(written, expected)
+        # The fetch stage stops on the short page
+        self.assertEqual(requested, [1, 2, 3, 4])
+        self.assertEqual(states, [1, 2, 3, 4, 5, None])
+        self.assertEqual(ctx.get_bookmark(["invoices", "UpdatedDateUTC"]), "2021-04-04T00:00:00Z")
+
+    def test_fetch_failure_is_raised(self):
+        with self.assertRaises(RuntimeError):
+            self.run_sync({"pipeline_pages": True}, [100, 100, 100], fail_on_page=2)
+
+    def test_transform_processes(self):
+        ctx, written, requested, states = self.run_sync({"transform_processes": 2}, [100, 30])
+
+        self.assertEqual(len(written), 130)
+        self.assertEqual(written[0], "1-0")
+        self.assertEqual(ctx.get_bookmark(["invoices", "UpdatedDateUTC"]), "2021-04-02T00:00:00Z")
@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import tap_xero
+import tap_xero.streams as streams_
+from tap_xero.context import Context
+
+
+class MockCatalogEntry:
+    def __init__(self):
+        self.schema = mock.Mock(to_dict=lambda: {"type": "object", "properties": {}})
+        self.metadata = []
+
+
+class MockResponse:
+    status_code = 200
+    headers = {}
+    text = '{"Accounts": [{"AccountID": "1", "UpdatedDateUTC": "/Date(1603895333000+0000)/"}]}'
+
+
+def build_context(config):
+    ctx = Context(dict({"start_date": "2021-01-01T00:00:00Z"}, **config), {},
+                  mock.Mock(get_stream=lambda tap_stream_id: MockCatalogEntry()), None)
+    ctx.client.access_token = "123"
+    ctx.client.tenant_id = "123"
+    ctx.get_record_transformer = mock.Mock(return_value=mock.Mock(transform=dict))
+    ctx.writer = mock.Mock()
+    return ctx
+
+
+@mock.patch("requests.Session.send", return_value=MockResponse())
+@mock.patch("tap_xero.profiling.metrics.log")
+class TestStreamProfiling(unittest.TestCase):
+    """
+    Test cases to verify that the phases of a stream's sync are timed and logged as metrics
+    """
+
+    def logged_phases(self, mocked_log):
+        return {call[0][1].tags["phase"]: call[0][1].value for call in mocked_log.call_args_list
+                if call[0][1].metric == "stream_phase_duration"}
+
+    def test_every_phase_is_timed(self, mocked_log, mocked_send):
+        ctx = build_context({"profile_streams": "true"})
+
+        tap_xero.sync_stream(ctx, streams_.BookmarkedStream("accounts", ["AccountID"]))
+
+        phases = self.logged_phases(mocked_log)
+        self.assertEqual(sorted(phases), ["format", "http_wait", "json_decode", "transform", "write"])
+        self.assertTrue(all(seconds >= 0 for seconds in phases.values()))
+        self.assertEqual(mocked_log.call_args[0][1].tags["endpoint"], "accounts")
+        # The profiler is only registered while its stream is syncing
+        self.assertEqual(ctx.client.profilers, {})
+
+    def test_nothing_is_timed_by_default(self, mocked_log, mocked_send):
+        ctx = build_context({})
+
+        tap_xero.sync_stream(ctx, streams_.BookmarkedStream("accounts", ["AccountID"]))
+
+        self.assertEqual(self.logged_phases(mocked_log), {})
+
+    def test_cprofile_is_dumped_per_stream(self, mocked_log, mocked_send):
+        with tempfile.TemporaryDirectory() as profile_dir:
+            ctx = build_context({"profile_dir": profile_dir}).for_tenant("tenant-a")
+
+            tap_xero.sync_stream(ctx, streams_.BookmarkedStream("accounts", ["AccountID"]))
+
+            self.assertEqual(os.listdir(profile_dir), ["tenant-a-accounts.prof"])
@@ -0,0 +1,85 @@
+import unittest
+
+import tap_xero.client as client_
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.TestCase):
+    """
+    Test cases to verify that requests are paced before Xero returns a 429
+    """
+
+    def build_limiter(self):
+        clock = FakeClock()
+        return client_.RateLimiter(clock=clock, sleep=clock.sleep), clock
+
+    def test_requests_under_the_limit_do_not_sleep(self):
+        limiter, clock = self.build_limiter()
+        for _ in range(client_.MINUTE_LIMIT):
+            with limiter:
+                clock.now += 0.1
+
+        self.assertEqual(clock.sleeps, [])
+
+    def test_minute_limit_is_paced_locally(self):
+        limiter, clock = self.build_limiter()
+        for _ in range(client_.MINUTE_LIMIT + 1):
+            with limiter:
+                pass
+
+        # The 61st request waits for the first one to leave the window
+        self.assertEqual(clock.sleeps, [60])
+
+    def test_remaining_header_pauses_until_window_rolls(self):
+        limiter, clock = self.build_limiter()
+        with limiter:
+            pass
+        limiter.observe({"X-MinLimit-Remaining": "0", "X-AppMinLimit-Remaining": "9000"})
+        clock.now += 10
+        with limiter:
+            pass
+
+        self.assertEqual(clock.sleeps, [50])
+
+    def test_app_limit_is_respected(self):
+        limiter, clock = self.build_limiter()
+        limiter.observe({"X-MinLimit-Remaining": "50", "X-AppMinLimit-Remaining": "1"})
+        with limiter:
+            pass
+        with limiter:
+            pass
+
+        self.assertEqual(clock.sleeps, [60])
+
+    def test_day_limit_raises_without_calling_the_api(self):
+        limiter, clock = self.build_limiter()
+        limiter.observe({"X-DayLimit-Remaining": "0"})
+
+        with self.assertRaises(client_.XeroTooManyError):
+            limiter.acquire()
+
+        # The concurrency slot is handed back after the failure
+        limiter.observe({"X-DayLimit-Remaining": "100"})
+        for _ in range(client_.CONCURRENT_LIMIT):
+            limiter.acquire()
+
+    def test_invalid_headers_are_ignored(self):
+        limiter, clock = self.build_limiter()
+        limiter.observe({"X-MinLimit-Remaining": "abc"})
+        limiter.observe(None)
+        with limiter:
+            pass
+
+        self.assertEqual(clock.sleeps, [])
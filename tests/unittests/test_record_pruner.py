@@ -0,0 +1,111 @@
+import copy
+import json
+import os
+import pickle
+import sys
+import unittest
+
+from singer import metadata, Transformer
+
+import tap_xero
+import tap_xero.client as client_
+import tap_xero.streams as streams_
+from tap_xero import transform
+from tap_xero.compiled_transform import RecordTransformer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+from benchmark_transform import build_records, run_benchmark  # pylint: disable=wrong-import-position
+
+
+class TestRecordPruner(unittest.TestCase):
+    """
+    Test cases to verify that the declarative pruners format records as the
+    hand written formatters did, and that the compiled transform applies them
+    """
+
+    def test_matches_previous_formatters(self):
+        # Raises if the records formatted by any pair differ
+        result = run_benchmark(records_per_stream=2, repeat=1)
+
+        self.assertIn("credit_notes", result)
+
+    def test_nested_paths_are_pruned_in_one_pass(self):
+        records = [{"Payments": [1], "Allocations": [{"Invoice": {"InvoiceID": "1", "Payments": [2]}},
+                                                    {"Invoice": None}, "unexpected"]},
+                   {"Allocations": None}]
+
+        transform.format_credit_notes(records)
+
+        self.assertEqual(records, [{"Allocations": [{"Invoice": {"InvoiceID": "1"}}, {"Invoice": None},
+                                                    "unexpected"]},
+                                   {"Allocations": None}])
+
+    def test_epoch_sentinel_is_rewritten(self):
+        records = [{"Date": transform.EPOCH_SENTINEL}, {"Date": "2021-01-01T00:00:00.000000Z"}]
+
+        transform.format_invoices(records)
+
+        self.assertEqual([record["Date"] for record in records],
+                         [transform.EPOCH, "2021-01-01T00:00:00.000000Z"])
+
+    def test_path_must_not_be_both_list_and_object(self):
+        with self.assertRaises(ValueError):
+            transform.RecordPruner(drop=["Allocations[].Invoice", "Allocations.Amount"])
+
+    def test_pruner_can_be_pickled(self):
+        pruner = pickle.loads(pickle.dumps(transform.format_credit_notes))
+        records = [{"Payments": [1], "Allocations": [{"Invoice": {"InvoiceID": "1", "Payments": [2]}}]}]
+
+        pruner(records)
+
+        self.assertEqual(pruner.drop, transform.format_credit_notes.drop)
+        self.assertEqual(records, [{"Allocations": [{"Invoice": {"InvoiceID": "1"}}]}])
+
+
+class TestFusedPruning(unittest.TestCase):
+    """
+    Test cases to verify that the compiled transform prunes records as
+    formatting them before the Transformer did
+    """
+
+    def assert_fused(self, stream, record):
+        schema = tap_xero.load_schema(stream.tap_stream_id)
+        mdata = tap_xero.load_metadata(stream, schema)
+        pruned = copy.deepcopy(record)
+        stream.pruner([pruned])
+        expected = Transformer().transform(pruned, schema, metadata.to_map(mdata))
+
+        transformer = RecordTransformer(schema, mdata, stream.pruner)
+        self.assertIsNotNone(transformer.compiled, stream.tap_stream_id)
+        self.assertEqual(transformer.compiled(copy.deepcopy(record)), (True, expected), stream.tap_stream_id)
+        self.assertEqual(transformer.transform(copy.deepcopy(record)), expected)
+
+    def test_matches_pruning_then_transforming(self):
+        for stream in streams_.all_streams:
+            if stream.pruner is None:
+                continue
+            # Decoded as the client does, so that the records compile
+            record = json.loads(build_records(stream.tap_stream_id, 1),
+                                object_hook=client_._json_load_object_hook)[0]
+            self.assert_fused(stream, record)
+
+    def test_epoch_sentinel_in_compiled_transform(self):
+        stream = next(s for s in streams_.all_streams if s.tap_stream_id == "invoices")
+
+        self.assert_fused(stream, {"InvoiceID": "1", "Date": transform.EPOCH_SENTINEL})
+
+    def test_fallback_prunes_before_transforming(self):
+        stream = next(s for s in streams_.all_streams if s.tap_stream_id == "users")
+        schema = tap_xero.load_schema("users")
+        transformer = RecordTransformer(schema, tap_xero.load_metadata(stream, schema), stream.pruner)
+        transformer.compiled = None
+        record = {"UserID": "1", "Warnings": [{"Message": "Lorem ipsum"}]}
+
+        self.assertEqual(transformer.transform(record), {"UserID": "1"})
+
+    def test_streams_do_not_format_pruned_records_separately(self):
+        stream = next(s for s in streams_.all_streams if s.tap_stream_id == "contacts")
+
+        self.assertIs(stream.pruner, transform.format_contacts)
+        self.assertIs(stream.format_fn, streams_._no_format)
@@ -0,0 +1,68 @@
+import gzip
+import io
+import unittest
+from unittest import mock
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from urllib3.response import HTTPResponse
+
+import tap_xero.client as client_
+
+BODY = b'{"Accounts": [' + b','.join([b'{"AccountID": "1", "Name": "Sales"}'] * 50) + b']}'
+
+
+def gzip_response(*args, **kwargs):
+    compressed = gzip.compress(BODY)
+    response = requests.Response()
+    response.status_code = 200
+    response.headers = CaseInsensitiveDict({"Content-Encoding": "gzip"})
+    response.raw = HTTPResponse(body=io.BytesIO(compressed), headers=response.headers,
+                                preload_content=False, decode_content=True)
+    response.encoding = "utf-8"
+    gzip_response.compressed_size = len(compressed)
+    return response
+
+
+@mock.patch("tap_xero.client.metrics.log")
+@mock.patch("requests.Session.send", side_effect=gzip_response)
+class TestResponseMetrics(unittest.TestCase):
+    """
+    Test cases to verify that compression is negotiated and payload sizes are reported
+    """
+
+    def build_client(self):
+        xero_client = client_.XeroClient({})
+        xero_client.access_token = "123"
+        xero_client.tenant_id = "123"
+        return xero_client
+
+    def logged_points(self, mocked_log):
+        return {call[0][1].metric: call[0][1] for call in mocked_log.call_args_list}
+
+    def test_accept_encoding_is_sent(self, mocked_send, mocked_log):
+        self.build_client().filter("accounts")
+
+        prepared_request = mocked_send.call_args[0][0]
+        self.assertEqual(prepared_request.headers["Accept-Encoding"], "gzip, deflate")
+
+    def test_sizes_and_durations_are_logged(self, mocked_send, mocked_log):
+        records = self.build_client().filter("accounts")
+
+        self.assertEqual(len(records), 50)
+        points = self.logged_points(mocked_log)
+        self.assertEqual(points["http_response_bytes"].value, len(BODY))
+        self.assertEqual(points["http_response_wire_bytes"].value, gzip_response.compressed_size)
+        self.assertEqual(points["http_response_bytes"].tags,
+                         {"endpoint": "accounts", "content_encoding": "gzip"})
+        self.assertGreaterEqual(points["http_response_decode_duration"].value, 0)
+        self.assertGreaterEqual(points["json_parse_duration"].value, 0)
+
+    def test_streamed_response_sizes_are_logged(self, mocked_send, mocked_log):
+        records = list(self.build_client().filter_stream("accounts"))
+
+        self.assertEqual(len(records), 50)
+        points = self.logged_points(mocked_log)
+        self.assertEqual(points["http_response_bytes"].value, len(BODY))
+        self.assertEqual(points["http_response_wire_bytes"].value, gzip_response.compressed_size)
+        self.assertNotIn("json_parse_duration", points)
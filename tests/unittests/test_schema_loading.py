@@ -0,0 +1,42 @@
+import unittest
+from unittest import mock
+
+import tap_xero
+import tap_xero.streams as streams_
+from tap_xero import build_schema_bundle
+
+
+class TestSchemaLoading(unittest.TestCase):
+    """
+    Test cases to verify that schemas are resolved once and served from the bundle
+    """
+
+    def tearDown(self):
+        tap_xero._load_schema_bundle.cache_clear()
+        tap_xero._schema_json.cache_clear()
+
+    def test_bundle_is_up_to_date(self):
+        # Run `python -m tap_xero.build_schema_bundle` if this fails
+        self.assertEqual(tap_xero._load_schema_bundle(), build_schema_bundle.build_bundle())
+
+    def test_every_stream_is_in_the_bundle(self):
+        self.assertEqual(sorted(tap_xero._load_schema_bundle()), sorted(streams_.all_stream_ids))
+
+    def test_each_call_returns_a_copy(self):
+        schema = tap_xero.load_schema("invoices")
+        schema["properties"]["TenantID"] = {"type": ["string"]}
+
+        self.assertNotIn("TenantID", tap_xero.load_schema("invoices")["properties"])
+
+    def test_schema_files_are_read_once_without_a_bundle(self):
+        tap_xero._schema_json.cache_clear()
+        with mock.patch.object(tap_xero, "_load_schema_bundle", return_value={}), \
+             mock.patch.object(tap_xero.utils, "load_json", wraps=tap_xero.utils.load_json) as mocked_load:
+            first = tap_xero.load_schema("invoices")
+            read_count = mocked_load.call_count
+            second = tap_xero.load_schema("invoices")
+
+        self.assertGreater(read_count, 1)
+        self.assertEqual(mocked_load.call_count, read_count)
+        self.assertEqual(first, second)
+        self.assertEqual(first, tap_xero._load_schema_bundle()["invoices"])
@@ -0,0 +1,40 @@
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+import tap_xero
+
+
+class TestStartup(unittest.TestCase):
+    """
+    Test cases to verify that optional modules are not imported at startup and
+    that startup timing is only logged when asked for
+    """
+
+    def test_optional_modules_are_not_imported(self):
+        output = subprocess.check_output([
+            sys.executable, "-c",
+            "import sys, tap_xero; "
+            "print([m for m in ('multiprocessing', 'tap_xero.pipeline') if m in sys.modules])"])
+
+        self.assertEqual(output.strip(), b"[]")
+
+    @mock.patch("tap_xero.LOGGER.info")
+    def test_timing_is_logged_when_enabled(self, mocked_info):
+        with mock.patch.dict("os.environ", {"TAP_XERO_DEBUG_TIMING": "1"}):
+            timer = tap_xero.StartupTimer(0)
+        timer.mark("imports")
+        timer.log()
+
+        self.assertEqual(mocked_info.call_args[0][0], "Startup timing: %s, total=%.1fms")
+        self.assertTrue(mocked_info.call_args[0][1].startswith("imports="))
+
+    @mock.patch("tap_xero.LOGGER.info")
+    def test_timing_is_not_logged_by_default(self, mocked_info):
+        with mock.patch.dict("os.environ", {}, clear=True):
+            timer = tap_xero.StartupTimer(0)
+        timer.mark("imports")
+        timer.log()
+
+        mocked_info.assert_not_called()
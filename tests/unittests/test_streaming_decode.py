@@ -0,0 +1,127 @@
+import decimal
+import json
+import unittest
+from unittest import mock
+
+import tap_xero.client as client_
+import tap_xero.streams as stream_
+from tap_xero.profiling import NULL_PROFILER
+
+BODY = ('{"Id": "abc", "Status": "OK", "ProviderName": "tap \\"Accounts\\": [", '
+        '"Accounts": [{"AccountID": "1", "UpdatedDateUTC": "/Date(1603895333000+0000)/", '
+        '"Balance": 10.25}, {"AccountID": "2", "Nested": {"List": [1, 2]}, "Count": 12345}], '
+        '"Trailer": null}')
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def build_decoder():
+    return json.JSONDecoder(object_hook=client_._json_load_object_hook,
+                            parse_float=decimal.Decimal)
+
+
+class TestIterJsonArray(unittest.TestCase):
+    """
+    Test cases to verify that records are decoded incrementally from a response body
+    """
+
+    def test_matches_json_loads_for_every_chunk_size(self):
+        expected = json.loads(BODY, object_hook=client_._json_load_object_hook,
+                              parse_float=decimal.Decimal)["Accounts"]
+        for size in range(1, len(BODY) + 1):
+            records = list(client_.iter_json_array(chunked(BODY, size), "Accounts", build_decoder()))
+            self.assertEqual(records, expected, "chunk size {}".format(size))
+
+    def test_numbers_split_at_every_offset(self):
+        body = ('{"Count": -12, "Invoices": [-1.5e-7, 2.25, 10, 3E+2, 0.000125, true, null, '
+                '{"Total": 1234.50, "Rate": -0.5e10}, [1.25, 2], 99]}')
+        expected = json.loads(body, parse_float=decimal.Decimal)["Invoices"]
+        for offset in range(1, len(body)):
+            records = list(client_.iter_json_array([body[:offset], body[offset:]], "Invoices",
+                                                   build_decoder()))
+            self.assertEqual(records, expected, "split at {!r}".format(body[:offset]))
+
+    def test_dates_and_decimals_are_decoded(self):
+        records = list(client_.iter_json_array([BODY], "Accounts", build_decoder()))
+
+        self.assertEqual(records[0]["UpdatedDateUTC"], "2020-10-28T14:28:53.000000Z")
+        self.assertEqual(records[0]["Balance"], decimal.Decimal("10.25"))
+
+    def test_empty_array(self):
+        records = list(client_.iter_json_array(['{"Accounts": []}'], "Accounts", build_decoder()))
+
+        self.assertEqual(records, [])
+
+    def test_missing_resource_raises(self):
+        with self.assertRaises(KeyError):
+            list(client_.iter_json_array(['{"Status": "OK"}'], "Accounts", build_decoder()))
+
+    def test_truncated_body_raises(self):
+        with self.assertRaises(json.JSONDecodeError):
+            list(client_.iter_json_array([BODY[:120]], "Accounts", build_decoder()))
+
+
+class MockStreamingResponse:
+    status_code = 200
+    headers = {}
+    encoding = None
+
+    def iter_content(self, chunk_size):
+        return [chunk.encode("utf-8") for chunk in chunked(BODY, 7)]
+
+    def close(self):
+        pass
+
+
+class TestFilterStream(unittest.TestCase):
+
+    @mock.patch("requests.Session.send", return_value=MockStreamingResponse())
+    def test_filter_stream_yields_records(self, mocked_send):
+        xero_client = client_.XeroClient({})
+        xero_client.access_token = "123"
+        xero_client.tenant_id = "123"
+
+        records = xero_client.filter_stream("accounts")
+
+        self.assertEqual(mocked_send.call_args[1], {"stream": True, "timeout": (30, 300)})
+        self.assertEqual([r["AccountID"] for r in records], ["1", "2"])
+
+
+class MockContext:
+    def __init__(self):
+        self.config = {"stream_responses": "true"}
+        self.bookmark = None
+
+    def update_start_date_bookmark(self, bookmark):
+        return "2021-04-01T00:00:00Z"
+
+    def get_profiler(self, tap_stream_id):
+        return NULL_PROFILER
+
+    def set_bookmark(self, bookmark, value):
+        self.bookmark = value
+
+    def write_state(self):
+        return ""
+
+
+class TestStreamedSync(unittest.TestCase):
+
+    @mock.patch("tap_xero.streams._make_request")
+    def test_bookmarked_stream_consumes_a_generator(self, mocked_make_request):
+        records = ({"AccountID": str(i), "UpdatedDateUTC": "2021-04-{:02d}T00:00:00Z".format(i % 28 + 1)}
+                   for i in range(250))
+        mocked_make_request.return_value = records
+        batches = []
+        ctx = MockContext()
+        stream = stream_.BookmarkedStream("accounts", ["AccountID"])
+
+        with mock.patch.object(stream_.BookmarkedStream, "write_records",
+                               side_effect=lambda batch, ctx: batches.append(len(batch))):
+            stream.sync(ctx)
+
+        self.assertEqual(mocked_make_request.call_args[1], {"stream_response": True})
+        self.assertEqual(batches, [100, 100, 50])
+        self.assertEqual(ctx.bookmark, "2021-04-28T00:00:00Z")
@@ -0,0 +1,142 @@
+import json
+import os
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+import requests
+
+import tap_xero.client as client_
+import tap_xero.streams as streams_
+from tap_xero.context import Context
+from tap_xero.token_cache import TokenCache
+
+
+class MockTokenResponse:
+    status_code = 200
+
+    def __init__(self, access_token):
+        self.access_token = access_token
+
+    def json(self):
+        return {"access_token": self.access_token, "refresh_token": "new-refresh", "expires_in": 1800}
+
+
+def build_response(status_code, body=b""):
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = "https://api.xero.com/api.xro/2.0/Currencies"
+    response.encoding = "utf-8"
+    response._content = body
+    return response
+
+
+class TestTokenCache(unittest.TestCase):
+    """
+    Test cases to verify that access tokens are reused until they are close to expiring
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "tokens.json")
+        self.now = 1000000
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def build_cache(self):
+        return TokenCache(self.path, clock=lambda: self.now)
+
+    def test_token_expires_with_margin(self):
+        cache = self.build_cache()
+        cache.put("key", "token", 1800)
+
+        self.now += 1400
+        self.assertEqual(cache.get("key"), "token")
+        self.now += 200
+        self.assertIsNone(cache.get("key"))
+
+    def test_file_is_private_and_expired_entries_are_dropped(self):
+        cache = self.build_cache()
+        cache.put("old", "token", 60)
+        self.now += 120
+        cache.put("new", "token", 1800)
+
+        with open(self.path) as cache_file:
+            self.assertEqual(list(json.load(cache_file)), ["new"])
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_key_depends_on_client_and_tenants(self):
+        key = TokenCache.key({"client_id": "a"}, ["t1", "t2"])
+
+        self.assertEqual(key, TokenCache.key({"client_id": "a"}, ["t2", "t1"]))
+        self.assertNotEqual(key, TokenCache.key({"client_id": "b"}, ["t1", "t2"]))
+        self.assertNotEqual(key, TokenCache.key({"client_id": "a"}, ["t1"]))
+
+    def test_unreadable_cache_is_ignored(self):
+        with open(self.path, "w") as cache_file:
+            cache_file.write("{not json")
+
+        self.assertIsNone(self.build_cache().get("key"))
+
+
+@mock.patch("tap_xero.client.update_config_file")
+class TestRefreshWithTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.config = {"client_id": "id", "client_secret": "secret", "tenant_id": "tenant",
+                       "refresh_token": "refresh",
+                       "token_cache_path": os.path.join(self.tmp_dir.name, "tokens.json")}
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_cached_token_skips_the_refresh(self, mocked_update_config):
+        first, second = client_.XeroClient(self.config), client_.XeroClient(self.config)
+        with mock.patch("requests.Session.post", return_value=MockTokenResponse("access-1")) as mocked_post:
+            first.refresh_credentials(self.config, "config.json")
+            second.refresh_credentials(self.config, "config.json")
+
+        self.assertEqual(mocked_post.call_count, 1)
+        self.assertEqual(mocked_update_config.call_count, 1)
+        self.assertEqual(second.access_token, "access-1")
+        self.assertEqual(second.tenant_id, "tenant")
+
+    def test_force_refreshes_and_updates_the_cache(self, mocked_update_config):
+        xero_client = client_.XeroClient(self.config)
+        with mock.patch("requests.Session.post", return_value=MockTokenResponse("access-1")):
+            xero_client.refresh_credentials(self.config, "config.json")
+        with mock.patch("requests.Session.post", return_value=MockTokenResponse("access-2")) as mocked_post:
+            xero_client.refresh_credentials(self.config, "config.json", force=True)
+            client_.XeroClient(self.config).refresh_credentials(self.config, "config.json")
+
+        self.assertEqual(mocked_post.call_count, 1)
+        self.assertEqual(xero_client.access_token, "access-2")
+
+    def test_no_cache_by_default(self, mocked_update_config):
+        del self.config["token_cache_path"]
+        with mock.patch("requests.Session.post", return_value=MockTokenResponse("access-1")) as mocked_post:
+            client_.XeroClient(self.config).refresh_credentials(self.config, "config.json")
+            client_.XeroClient(self.config).refresh_credentials(self.config, "config.json")
+
+        self.assertEqual(mocked_post.call_count, 2)
+        self.assertFalse(os.listdir(self.tmp_dir.name))
+
+    def test_rejected_cached_token_is_refreshed(self, mocked_update_config):
+        with mock.patch("requests.Session.post", return_value=MockTokenResponse("revoked")):
+            client_.XeroClient(self.config).refresh_credentials(self.config, "config.json")
+        ctx = Context(self.config, {}, None, "config.json")
+        ctx.refresh_credentials()
+        responses = [build_response(401),
+                     build_response(200, json.dumps({"Currencies": [{"Code": "NZD"}]}).encode("utf-8"))]
+
+        with mock.patch("requests.Session.post", return_value=MockTokenResponse("access-2")) as mocked_post, \
+             mock.patch("requests.Session.send", side_effect=responses) as mocked_send:
+            records = streams_._make_request(ctx, "currencies")
+
+        self.assertEqual(records, [{"Code": "NZD"}])
+        self.assertEqual(mocked_post.call_count, 1)
+        self.assertEqual([call[0][0].headers["Authorization"] for call in mocked_send.call_args_list],
+                         ["Bearer revoked", "Bearer access-2"])